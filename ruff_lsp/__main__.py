@@ -1,17 +1,32 @@
-import argparse
+import sys
 
 
 def main() -> None:
-    from ruff_lsp import __version__, server
+    # Fast path: avoid importing and building an `argparse` parser when the only
+    # argument is a version request.
+    if sys.argv[1:] in (["--version"], ["-V"]):
+        from ruff_lsp import __version__
+
+        print(f"ruff-lsp {__version__}")  # noqa: T201
+        sys.exit(0)
+
+    import argparse
+
+    from ruff_lsp import __version__
 
     parser = argparse.ArgumentParser(prog="ruff-lsp")
     parser.add_argument(
+        "-V",
         "--version",
         action="version",
         version=f"%(prog)s {__version__}",
     )
     parser.parse_args()
 
+    # Import the server (and with it, `pygls` and `lsprotocol`) only once we know
+    # we're going to start it.
+    from ruff_lsp import server
+
     server.start()
 
 
@@ -3,7 +3,11 @@
 from __future__ import annotations
 
 import asyncio
+import contextlib
 import enum
+import functools
+import hashlib
+import itertools
 import json
 import logging
 import os
@@ -11,10 +15,13 @@ import re
 import shutil
 import sys
 import sysconfig
-from collections.abc import Iterable, Mapping
-from dataclasses import dataclass
+import time
+from collections import OrderedDict, defaultdict
+from collections.abc import Awaitable, Callable, Iterable, Mapping
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, List, NamedTuple, Sequence, Union, cast
+from typing import Any, List, NamedTuple, Sequence, Tuple, Union, cast
 
 from lsprotocol.types import (
     CODE_ACTION_RESOLVE,
@@ -31,6 +38,7 @@ from lsprotocol.types import (
     TEXT_DOCUMENT_FORMATTING,
     TEXT_DOCUMENT_HOVER,
     TEXT_DOCUMENT_RANGE_FORMATTING,
+    WORKSPACE_DID_CHANGE_WATCHED_FILES,
     AnnotatedTextEdit,
     ClientCapabilities,
     CodeAction,
@@ -43,6 +51,7 @@ from lsprotocol.types import (
     DiagnosticTag,
     DidChangeNotebookDocumentParams,
     DidChangeTextDocumentParams,
+    DidChangeWatchedFilesParams,
     DidCloseNotebookDocumentParams,
     DidCloseTextDocumentParams,
     DidOpenNotebookDocumentParams,
@@ -83,7 +92,10 @@ from ruff_lsp.settings import (
     Run,
     UserSettings,
     WorkspaceSettings,
+    disable_rule_comment_enable,
+    fix_violation_enable,
     lint_args,
+    lint_debounce,
     lint_enable,
     lint_run,
 )
@@ -107,21 +119,75 @@ if sys.platform == "win32" and sys.version_info < (3, 8):
 
 GLOBAL_SETTINGS: UserSettings = {}
 WORKSPACE_SETTINGS: dict[str, WorkspaceSettings] = {}
+# Resolved settings for each document path, derived from `WORKSPACE_SETTINGS`.
+DOCUMENT_SETTINGS: dict[str, WorkspaceSettings] = {}
+# The settings for non-workspace files, keyed by the directory containing them.
+DIRECTORY_SETTINGS: dict[str, WorkspaceSettings] = {}
+# The fingerprint of each resolved settings dict, keyed by its `id`.
+SETTINGS_FINGERPRINTS: dict[int, tuple[WorkspaceSettings, str]] = {}
 INTERPRETER_PATHS: dict[str, str] = {}
+# The resolved executable path, keyed by the `path`, `importStrategy`, and
+# `interpreter` settings, and the bundled executable.
+BINARY_PATHS: dict[tuple[tuple[str, ...], str, tuple[str, ...], str | None], str] = {}
 
 
 class VersionModified(NamedTuple):
     version: Version
     """Last modified of the executable"""
     modified: float
+    checked_at: float
+    """When the modification time was last checked, per `time.monotonic`."""
 
 
 EXECUTABLE_VERSIONS: dict[str, VersionModified] = {}
+# How long (in seconds) to trust a cached executable version before checking whether
+# the executable was modified.
+EXECUTABLE_VERSION_TTL = 2.0
 CLIENT_CAPABILITIES: dict[str, bool] = {
     CODE_ACTION_RESOLVE: True,
 }
 
+# Debounced lints that are yet to complete, keyed by document URI.
+PENDING_LINTS: dict[str, asyncio.Future[None]] = {}
+
+# Incremented whenever Ruff's configuration files may have changed (e.g., on save), such
+# that results computed against an earlier configuration are never reused.
+CONFIGURATION_GENERATION = 0
+# The names of the files from which Ruff reads its configuration.
+RUFF_CONFIG_FILES = frozenset({"pyproject.toml", "ruff.toml", ".ruff.toml"})
+
+# The key of a lint result: the document path, source digest, settings fingerprint,
+# executable path and version, and configuration generation.
+LintCacheKey = Tuple[str, bytes, str, str, str, int]
+
+# The maximum number of lint results to retain in `LINT_CACHE`.
+LINT_CACHE_SIZE = 256
+# Lint results, keyed by `LintCacheKey`.
+LINT_CACHE: OrderedDict[LintCacheKey, list[Diagnostic]] = OrderedDict()
+# Lints that are yet to complete, keyed like `LINT_CACHE`.
+INFLIGHT_LINTS: dict[LintCacheKey, InflightLint] = {}
+# The maximum number of fix results to retain in `FIX_CACHE`.
+FIX_CACHE_SIZE = 128
+# Fix results, keyed by document URI and version, the `LINT_CACHE` key, and the rules
+# to fix.
+FIX_CACHE: OrderedDict[
+    tuple[str, int | None, LintCacheKey, tuple[str, ...] | None],
+    WorkspaceEdit,
+] = OrderedDict()
+# The diagnostics last published for each document (or cell) URI.
+PUBLISHED_DIAGNOSTICS: dict[str, list[Diagnostic]] = {}
+# Published for cells without diagnostics; shared between cells, and never mutated.
+NO_DIAGNOSTICS: list[Diagnostic] = []
+# The cells of each open Notebook Document by cell URI, along with the Notebook version
+# the index was built for.
+CELL_INDEX: dict[str, tuple[int, dict[str, NotebookCell]]] = {}
+
 MAX_WORKERS = 5
+# Executor for CPU-bound work that would otherwise stall the event loop.
+EXECUTOR = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="ruff-lsp")
+# The size (in bytes) of Ruff's output above which it is parsed on `EXECUTOR`.
+PARSE_OUTPUT_EXECUTOR_THRESHOLD = 64 * 1024
+
 LSP_SERVER = server.LanguageServer(
     name="Ruff",
     version=__version__,
@@ -142,6 +208,8 @@ LSP_SERVER = server.LanguageServer(
 
 TOOL_MODULE = "ruff.exe" if sys.platform == "win32" else "ruff"
 TOOL_DISPLAY = "Ruff"
+# The path to the executable in the current interpreter's scripts directory.
+TOOL_SCRIPT_PATH = os.path.join(sysconfig.get_path("scripts"), TOOL_MODULE)
 
 # Require at least Ruff v0.0.291 for formatting, but allow older versions for linting.
 VERSION_REQUIREMENT_FORMATTER = SpecifierSet(">=0.0.291")
@@ -152,6 +220,9 @@ VERSION_REQUIREMENT_OUTPUT_FORMAT = SpecifierSet(">=0.0.291")
 # Version requirement after which Ruff avoids writing empty output for excluded files.
 VERSION_REQUIREMENT_EMPTY_OUTPUT = SpecifierSet(">=0.1.6")
 
+# Converts positions in UTF-16 code units, as sent by the client, to code points.
+UTF16_CODEC = PositionCodec(PositionEncodingKind.Utf16)
+
 # Arguments provided to every Ruff invocation.
 CHECK_ARGS = [
     "check",
@@ -163,54 +234,71 @@ CHECK_ARGS = [
     "json",
     "-",
 ]
+# The index of the `--output-format` option in `CHECK_ARGS`.
+OUTPUT_FORMAT_INDEX = CHECK_ARGS.index("--output-format")
 
 # Arguments that are not allowed to be passed to `ruff check`.
-UNSUPPORTED_CHECK_ARGS = [
-    # Arguments that enforce required behavior. These can be ignored with a warning.
-    "--force-exclude",
-    "--no-cache",
-    "--no-fix",
-    "--quiet",
-    # Arguments that contradict the required behavior. These can be ignored with a
-    # warning.
-    "--diff",
-    "--exit-non-zero-on-fix",
-    "-e",
-    "--exit-zero",
-    "--fix",
-    "--fix-only",
-    "-h",
-    "--help",
-    "--no-force-exclude",
-    "--show-files",
-    "--show-fixes",
-    "--show-settings",
-    "--show-source",
-    "--silent",
-    "--statistics",
-    "--verbose",
-    "-w",
-    "--watch",
-    # Arguments that are not supported at all, and will error when provided.
-    # "--stdin-filename",
-    # "--output-format",
-]
+UNSUPPORTED_CHECK_ARGS = frozenset(
+    {
+        # Arguments that enforce required behavior. These can be ignored with a warning.
+        "--force-exclude",
+        "--no-cache",
+        "--no-fix",
+        "--quiet",
+        # Arguments that contradict the required behavior. These can be ignored with a
+        # warning.
+        "--diff",
+        "--exit-non-zero-on-fix",
+        "-e",
+        "--exit-zero",
+        "--fix",
+        "--fix-only",
+        "-h",
+        "--help",
+        "--no-force-exclude",
+        "--show-files",
+        "--show-fixes",
+        "--show-settings",
+        "--show-source",
+        "--silent",
+        "--statistics",
+        "--verbose",
+        "-w",
+        "--watch",
+        # Arguments that are not supported at all, and will error when provided.
+        # "--stdin-filename",
+        # "--output-format",
+    }
+)
 
 # Arguments that are not allowed to be passed to `ruff format`.
-UNSUPPORTED_FORMAT_ARGS = [
-    # Arguments that enforce required behavior. These can be ignored with a warning.
-    "--force-exclude",
-    "--quiet",
-    # Arguments that contradict the required behavior. These can be ignored with a
-    # warning.
-    "-h",
-    "--help",
-    "--no-force-exclude",
-    "--silent",
-    "--verbose",
-    # Arguments that are not supported at all, and will error when provided.
-    # "--stdin-filename",
-]
+UNSUPPORTED_FORMAT_ARGS = frozenset(
+    {
+        # Arguments that enforce required behavior. These can be ignored with a warning.
+        "--force-exclude",
+        "--quiet",
+        # Arguments that contradict the required behavior. These can be ignored with a
+        # warning.
+        "-h",
+        "--help",
+        "--no-force-exclude",
+        "--silent",
+        "--verbose",
+        # Arguments that are not supported at all, and will error when provided.
+        # "--stdin-filename",
+    }
+)
+
+# Options that select or ignore rules, which are dropped when running specific rules.
+RULE_SELECTION_OPTIONS = frozenset(
+    {"--select", "--extend-select", "--ignore", "--extend-ignore"}
+)
+RULE_SELECTION_PREFIXES = (
+    "--select=",
+    "--extend-select=",
+    "--ignore=",
+    "--extend-ignore=",
+)
 
 # Standard code action kinds, scoped to Ruff.
 SOURCE_FIX_ALL_RUFF = f"{CodeActionKind.SourceFixAll.value}.ruff"
@@ -257,15 +345,47 @@ class DocumentKind(enum.Enum):
     """A cell in a Notebook Document."""
 
 
+@dataclass
+class InflightLint:
+    """A running lint, shared between the requests that await it."""
+
+    task: asyncio.Future[list[Diagnostic]]
+    waiters: int = 0
+
+
 @dataclass(frozen=True)
 class Document:
     """A document representing either a Python file, a Notebook cell, or a Notebook."""
 
     uri: str
     path: str
-    source: str
     kind: DocumentKind
     version: int | None
+    _source: str | None = field(default=None, repr=False, compare=False)
+    # For Notebooks, the source is serialized on first access, as some requests
+    # (e.g., those for standard library files) never need it.
+    _notebook_document: NotebookDocument | None = field(
+        default=None, repr=False, compare=False
+    )
+    _encoded_source: bytes | None = field(default=None, repr=False, compare=False)
+
+    @property
+    def source(self) -> str:
+        """The source of the document."""
+        if self._source is None:
+            assert self._notebook_document is not None
+            object.__setattr__(
+                self, "_source", _create_notebook_json(self._notebook_document)
+            )
+            object.__setattr__(self, "_notebook_document", None)
+        return cast(str, self._source)
+
+    @property
+    def encoded_source(self) -> bytes:
+        """The UTF-8 encoded source of the document, as passed to Ruff."""
+        if self._encoded_source is None:
+            object.__setattr__(self, "_encoded_source", self.source.encode("utf-8"))
+        return cast(bytes, self._encoded_source)
 
     @classmethod
     def from_text_document(cls, text_document: workspace.TextDocument) -> Self:
@@ -274,7 +394,7 @@ class Document:
             uri=text_document.uri,
             path=text_document.path,
             kind=DocumentKind.Text,
-            source=text_document.source,
+            _source=text_document.source,
             version=text_document.version,
         )
 
@@ -285,7 +405,7 @@ class Document:
             uri=notebook_document.uri,
             path=_uri_to_fs_path(notebook_document.uri),
             kind=DocumentKind.Notebook,
-            source=_create_notebook_json(notebook_document),
+            _notebook_document=notebook_document,
             version=notebook_document.version,
         )
 
@@ -296,7 +416,7 @@ class Document:
             uri=notebook_cell.document,
             path=_uri_to_fs_path(notebook_cell.document),
             kind=DocumentKind.Cell,
-            source=_create_single_cell_notebook_json(
+            _source=_create_single_cell_notebook_json(
                 LSP_SERVER.workspace.get_text_document(notebook_cell.document).source
             ),
             version=None,
@@ -310,16 +430,13 @@ class Document:
         The function will try to get the Notebook cell first, and if there's no cell
         with the given URI, it will fallback to the text document.
         """
-        notebook_document = LSP_SERVER.workspace.get_notebook_document(cell_uri=uri)
+        notebook_document = (
+            LSP_SERVER.workspace.get_notebook_document(cell_uri=uri)
+            if LSP_SERVER.workspace.notebook_documents
+            else None
+        )
         if notebook_document is not None:
-            notebook_cell = next(
-                (
-                    notebook_cell
-                    for notebook_cell in notebook_document.cells
-                    if notebook_cell.document == uri
-                ),
-                None,
-            )
+            notebook_cell = _get_cell_index(notebook_document).get(uri)
             if notebook_cell is not None:
                 return cls.from_notebook_cell(notebook_cell)
 
@@ -336,16 +453,18 @@ class Document:
         try to get the notebook document first, and if there's no notebook document
         with the given URI, it will fallback to the text document.
         """
-        # First, try to get the Notebook Document assuming the URI is a Cell URI.
-        notebook_document = LSP_SERVER.workspace.get_notebook_document(cell_uri=uri)
-        if notebook_document is None:
-            # If that fails, try to get the Notebook Document assuming the URI is a
-            # Notebook URI.
-            notebook_document = LSP_SERVER.workspace.get_notebook_document(
-                notebook_uri=uri
-            )
-        if notebook_document:
-            return cls.from_notebook_document(notebook_document)
+        # Skip the Notebook lookups entirely if no Notebook Document is open.
+        if LSP_SERVER.workspace.notebook_documents:
+            # First, try to get the Notebook Document assuming the URI is a Cell URI.
+            notebook_document = LSP_SERVER.workspace.get_notebook_document(cell_uri=uri)
+            if notebook_document is None:
+                # If that fails, try to get the Notebook Document assuming the URI is
+                # a Notebook URI.
+                notebook_document = LSP_SERVER.workspace.get_notebook_document(
+                    notebook_uri=uri
+                )
+            if notebook_document:
+                return cls.from_notebook_document(notebook_document)
 
         # Fall back to the Text Document representing a Python file.
         text_document = LSP_SERVER.workspace.get_text_document(uri)
@@ -356,6 +475,17 @@ class Document:
         return utils.is_stdlib_file(self.path)
 
 
+def _get_cell_index(notebook_document: NotebookDocument) -> dict[str, NotebookCell]:
+    """Return the cells of the given Notebook Document, keyed by cell URI."""
+    cached = CELL_INDEX.get(notebook_document.uri)
+    if cached is not None and cached[0] == notebook_document.version:
+        return cached[1]
+
+    cell_index = {cell.document: cell for cell in notebook_document.cells}
+    CELL_INDEX[notebook_document.uri] = (notebook_document.version, cell_index)
+    return cell_index
+
+
 SourceValue = Union[str, List[str]]
 
 
@@ -385,55 +515,47 @@ class Notebook(TypedDict):
     cells: list[CodeCell | MarkdownCell]
 
 
+# Fixed parts of the JSON representation of a Notebook Document, such that only the
+# cell sources need to be encoded when serializing a notebook.
+NOTEBOOK_JSON_PREFIX = '{"metadata":{},"nbformat":4,"nbformat_minor":5,"cells":['
+NOTEBOOK_JSON_SUFFIX = "]}"
+CODE_CELL_JSON_PREFIX = '{"cell_type":"code","metadata":{},"outputs":[],"source":'
+MARKDOWN_CELL_JSON_PREFIX = '{"cell_type":"markdown","metadata":{},"source":'
+CELL_JSON_SUFFIX = "}"
+
+
 def _create_notebook_json(notebook_document: NotebookDocument) -> str:
-    """Create a JSON representation of the given Notebook Document."""
-    cells: list[CodeCell | MarkdownCell] = []
-    for notebook_cell in notebook_document.cells:
+    """Create a JSON representation of the given Notebook Document.
+
+    The JSON is written out directly, rather than building (and then serializing) a
+    `Notebook` dictionary holding every cell.
+    """
+    parts: list[str] = [NOTEBOOK_JSON_PREFIX]
+    for cell_idx, notebook_cell in enumerate(notebook_document.cells):
         cell_document = LSP_SERVER.workspace.get_text_document(notebook_cell.document)
+        if cell_idx:
+            parts.append(",")
         if notebook_cell.kind is NotebookCellKind.Code:
-            cells.append(
-                {
-                    "cell_type": "code",
-                    "metadata": {},
-                    "outputs": [],
-                    "source": cell_document.source,
-                }
-            )
+            parts.append(CODE_CELL_JSON_PREFIX)
         else:
-            cells.append(
-                {
-                    "cell_type": "markdown",
-                    "metadata": {},
-                    "source": cell_document.source,
-                }
-            )
-    return json.dumps(
-        {
-            "metadata": {},
-            "nbformat": 4,
-            "nbformat_minor": 5,
-            "cells": cells,
-        }
-    )
+            parts.append(MARKDOWN_CELL_JSON_PREFIX)
+        parts.append(utils.json_dumps(cell_document.source))
+        parts.append(CELL_JSON_SUFFIX)
+    parts.append(NOTEBOOK_JSON_SUFFIX)
+    return "".join(parts)
 
 
 def _create_single_cell_notebook_json(source: str) -> str:
     """Create a JSON representation of a single cell Notebook Document containing
     the given source."""
-    return json.dumps(
-        {
-            "metadata": {},
-            "nbformat": 4,
-            "nbformat_minor": 5,
-            "cells": [
-                {
-                    "cell_type": "code",
-                    "metadata": {},
-                    "outputs": [],
-                    "source": source,
-                }
-            ],
-        }
+    return "".join(
+        (
+            NOTEBOOK_JSON_PREFIX,
+            CODE_CELL_JSON_PREFIX,
+            utils.json_dumps(source),
+            CELL_JSON_SUFFIX,
+            NOTEBOOK_JSON_SUFFIX,
+        )
     )
 
 
@@ -453,20 +575,26 @@ async def did_open(params: DidOpenTextDocumentParams) -> None:
         return None
 
     diagnostics = await _lint_document_impl(document, settings)
-    LSP_SERVER.publish_diagnostics(document.uri, diagnostics)
+    _publish_diagnostics(document.uri, diagnostics)
 
 
 @LSP_SERVER.feature(TEXT_DOCUMENT_DID_CLOSE)
 def did_close(params: DidCloseTextDocumentParams) -> None:
     """LSP handler for textDocument/didClose request."""
-    text_document = LSP_SERVER.workspace.get_text_document(params.text_document.uri)
+    uri = params.text_document.uri
+    _cancel_pending_lint(uri)
+    PUBLISHED_DIAGNOSTICS.pop(uri, None)
     # Publishing empty diagnostics to clear the entries for this file.
-    LSP_SERVER.publish_diagnostics(text_document.uri, [])
+    LSP_SERVER.publish_diagnostics(uri, [])
 
 
 @LSP_SERVER.feature(TEXT_DOCUMENT_DID_SAVE)
 async def did_save(params: DidSaveTextDocumentParams) -> None:
     """LSP handler for textDocument/didSave request."""
+    # Saving is the way to refresh the diagnostics after editing Ruff's configuration.
+    config_changed = _is_ruff_config_file(params.text_document.uri)
+    if config_changed:
+        _invalidate_results()
     text_document = LSP_SERVER.workspace.get_text_document(params.text_document.uri)
     settings = _get_settings_by_document(text_document.path)
     if not lint_enable(settings):
@@ -476,9 +604,15 @@ async def did_save(params: DidSaveTextDocumentParams) -> None:
         Run.OnType,
         Run.OnSave,
     ):
-        document = Document.from_text_document(text_document)
-        diagnostics = await _lint_document_impl(document, settings)
-        LSP_SERVER.publish_diagnostics(document.uri, diagnostics)
+        if not config_changed and _diagnostics_are_current(
+            Document.from_text_document(text_document), settings
+        ):
+            # The saved source was already linted (e.g., as it was typed).
+            return None
+
+        # The document is linted right away, which supersedes any pending lint.
+        _cancel_pending_lint(text_document.uri)
+        await _lint_text_document(text_document.uri, settings)
 
 
 @LSP_SERVER.feature(TEXT_DOCUMENT_DID_CHANGE)
@@ -490,9 +624,77 @@ async def did_change(params: DidChangeTextDocumentParams) -> None:
         return None
 
     if lint_run(settings) == Run.OnType:
-        document = Document.from_text_document(text_document)
-        diagnostics = await _lint_document_impl(document, settings)
-        LSP_SERVER.publish_diagnostics(document.uri, diagnostics)
+        _schedule_lint(
+            text_document.uri,
+            functools.partial(_lint_text_document, text_document.uri, settings),
+            delay=lint_debounce(settings) / 1000,
+        )
+
+
+async def _lint_text_document(uri: str, settings: WorkspaceSettings) -> None:
+    """Lint the latest source of the given Text Document and publish the diagnostics."""
+    document = Document.from_text_document(LSP_SERVER.workspace.get_text_document(uri))
+    diagnostics = await _lint_document_impl(document, settings)
+    _publish_diagnostics(document.uri, diagnostics)
+
+
+def _diagnostics_are_current(document: Document, settings: WorkspaceSettings) -> bool:
+    """Returns `True` if the diagnostics published for the document are those of linting
+    its current source with the current settings and configuration."""
+    if settings["ignoreStandardLibrary"] and document.is_stdlib_file():
+        return False
+    executable = _find_ruff_binary(settings, VERSION_REQUIREMENT_LINTER)
+    diagnostics = LINT_CACHE.get(_lint_cache_key(document, settings, executable))
+    if diagnostics is None:
+        return False
+    return PUBLISHED_DIAGNOSTICS.get(document.uri) == diagnostics
+
+
+def _publish_diagnostics(uri: str, diagnostics: list[Diagnostic]) -> None:
+    """Publish the diagnostics for the given URI, unless they're unchanged since the
+    last publish."""
+    if PUBLISHED_DIAGNOSTICS.get(uri) == diagnostics:
+        return
+    PUBLISHED_DIAGNOSTICS[uri] = diagnostics
+    LSP_SERVER.publish_diagnostics(uri, diagnostics)
+
+
+def _schedule_lint(
+    uri: str, lint: Callable[[], Awaitable[None]], *, delay: float
+) -> None:
+    """Schedule a lint for the document with the given URI, debounced by `delay`
+    seconds.
+
+    Any lint that's still pending (or running) for the same document is cancelled, such
+    that a burst of changes results in a single Ruff invocation against the latest
+    source.
+    """
+    _cancel_pending_lint(uri)
+    PENDING_LINTS[uri] = asyncio.ensure_future(_run_debounced_lint(uri, lint, delay))
+
+
+async def _run_debounced_lint(
+    uri: str, lint: Callable[[], Awaitable[None]], delay: float
+) -> None:
+    try:
+        await asyncio.sleep(delay)
+        await lint()
+    except asyncio.CancelledError:
+        # Superseded by a more recent change, or the document was closed.
+        pass
+    except Exception as e:
+        # Nothing awaits this task, so surface the error rather than losing it.
+        show_error(f"Ruff: Lint failed ({e})")
+    finally:
+        if PENDING_LINTS.get(uri) is asyncio.current_task():
+            del PENDING_LINTS[uri]
+
+
+def _cancel_pending_lint(uri: str) -> None:
+    """Cancel the pending lint (if any) for the document with the given URI."""
+    task = PENDING_LINTS.pop(uri, None)
+    if task is not None:
+        task.cancel()
 
 
 @LSP_SERVER.feature(NOTEBOOK_DOCUMENT_DID_OPEN)
@@ -514,7 +716,7 @@ async def did_open_notebook(params: DidOpenNotebookDocumentParams) -> None:
 
     # Publish diagnostics for each cell.
     for cell_idx, diagnostics in _group_diagnostics_by_cell(diagnostics).items():
-        LSP_SERVER.publish_diagnostics(
+        _publish_diagnostics(
             # The cell indices are 1-based in Ruff.
             params.notebook_document.cells[cell_idx - 1].document,
             diagnostics,
@@ -524,15 +726,20 @@ async def did_open_notebook(params: DidOpenNotebookDocumentParams) -> None:
 @LSP_SERVER.feature(NOTEBOOK_DOCUMENT_DID_CLOSE)
 def did_close_notebook(params: DidCloseNotebookDocumentParams) -> None:
     """LSP handler for notebookDocument/didClose request."""
+    _cancel_pending_lint(params.notebook_document.uri)
+    CELL_INDEX.pop(params.notebook_document.uri, None)
     # Publishing empty diagnostics to clear the entries for all the cells in this
     # Notebook Document.
+    publish_diagnostics = LSP_SERVER.publish_diagnostics
     for cell_text_document in params.cell_text_documents:
-        LSP_SERVER.publish_diagnostics(cell_text_document.uri, [])
+        PUBLISHED_DIAGNOSTICS.pop(cell_text_document.uri, None)
+        publish_diagnostics(cell_text_document.uri, NO_DIAGNOSTICS)
 
 
 @LSP_SERVER.feature(NOTEBOOK_DOCUMENT_DID_SAVE)
 async def did_save_notebook(params: DidSaveNotebookDocumentParams) -> None:
     """LSP handler for notebookDocument/didSave request."""
+    _cancel_pending_lint(params.notebook_document.uri)
     await _did_change_or_save_notebook(
         params.notebook_document.uri, run_types=[Run.OnSave, Run.OnType]
     )
@@ -541,11 +748,32 @@ async def did_save_notebook(params: DidSaveNotebookDocumentParams) -> None:
 @LSP_SERVER.feature(NOTEBOOK_DOCUMENT_DID_CHANGE)
 async def did_change_notebook(params: DidChangeNotebookDocumentParams) -> None:
     """LSP handler for notebookDocument/didChange request."""
-    await _did_change_or_save_notebook(
-        params.notebook_document.uri, run_types=[Run.OnType]
+    settings = _get_settings_by_document(_uri_to_fs_path(params.notebook_document.uri))
+    _schedule_lint(
+        params.notebook_document.uri,
+        functools.partial(
+            _did_change_or_save_notebook,
+            params.notebook_document.uri,
+            run_types=[Run.OnType],
+        ),
+        delay=lint_debounce(settings) / 1000,
     )
 
 
+@LSP_SERVER.feature(WORKSPACE_DID_CHANGE_WATCHED_FILES)
+def did_change_watched_files(params: DidChangeWatchedFilesParams) -> None:
+    """LSP handler for workspace/didChangeWatchedFiles request."""
+    # For clients that watch Ruff's configuration files (e.g., `pyproject.toml`).
+    if any(_is_ruff_config_file(change.uri) for change in params.changes):
+        _invalidate_results()
+
+
+def _is_ruff_config_file(uri: str) -> bool:
+    """Returns `True` if the given URI refers to one of Ruff's configuration files."""
+    path = uris.to_fs_path(uri)
+    return path is not None and os.path.basename(path) in RUFF_CONFIG_FILES
+
+
 def _group_diagnostics_by_cell(
     diagnostics: Iterable[Diagnostic],
 ) -> Mapping[int, list[Diagnostic]]:
@@ -555,11 +783,14 @@ def _group_diagnostics_by_cell(
     that cell. The mapping will be empty if the diagnostic doesn't contain the cell
     information.
     """
-    cell_diagnostics: dict[int, list[Diagnostic]] = {}
+    cell_diagnostics: defaultdict[int, list[Diagnostic]] = defaultdict(list)
     for diagnostic in diagnostics:
-        cell = cast(DiagnosticData, diagnostic.data).get("cell")
+        data: DiagnosticData | None = diagnostic.data
+        if data is None:
+            continue
+        cell = data.get("cell")
         if cell is not None:
-            cell_diagnostics.setdefault(cell, []).append(diagnostic)
+            cell_diagnostics[cell].append(diagnostic)
     return cell_diagnostics
 
 
@@ -588,21 +819,67 @@ async def _did_change_or_save_notebook(
         # This is required here because a cell containing diagnostics in the first run
         # might not contain any diagnostics in the second run. In that case, we need to
         # clear the diagnostics for that cell which is done by publishing empty
-        # diagnostics.
+        # diagnostics. Cells whose diagnostics are unchanged (e.g., all but the edited
+        # cell) are skipped.
+        get_cell_diagnostics = cell_diagnostics.get
         for cell_idx, cell in enumerate(notebook_document.cells):
             if cell.kind is not NotebookCellKind.Code:
                 continue
-            LSP_SERVER.publish_diagnostics(
+            _publish_diagnostics(
                 cell.document,
                 # The cell indices are 1-based in Ruff.
-                cell_diagnostics.get(cell_idx + 1, []),
+                get_cell_diagnostics(cell_idx + 1, NO_DIAGNOSTICS),
             )
 
 
 async def _lint_document_impl(
     document: Document, settings: WorkspaceSettings
 ) -> list[Diagnostic]:
-    result = await _run_check_on_document(document, settings)
+    # Check for standard library files first, such that their source (which, for
+    # Notebooks, has to be serialized) is never needed.
+    if settings["ignoreStandardLibrary"] and document.is_stdlib_file():
+        log_warning(f"Skipping standard library file: {document.path}")
+        return []
+
+    # Re-linting identical source with identical settings and an identical executable
+    # (e.g., when re-opening a document, or undoing an edit) yields identical
+    # diagnostics.
+    executable = _find_ruff_binary(settings, VERSION_REQUIREMENT_LINTER)
+    key = _lint_cache_key(document, settings, executable)
+    diagnostics = LINT_CACHE.get(key)
+    if diagnostics is not None:
+        LINT_CACHE.move_to_end(key)
+        return list(diagnostics)
+
+    # Identical lints that overlap (e.g., a save racing a change notification) share
+    # a single Ruff process.
+    inflight = INFLIGHT_LINTS.get(key)
+    if inflight is None:
+        inflight = INFLIGHT_LINTS[key] = InflightLint(
+            asyncio.ensure_future(_run_lint(document, settings, executable, key))
+        )
+    inflight.waiters += 1
+    try:
+        return list(await asyncio.shield(inflight.task))
+    except asyncio.CancelledError:
+        # Only stop Ruff once nobody else is waiting on the result.
+        if inflight.waiters == 1:
+            inflight.task.cancel()
+        raise
+    finally:
+        inflight.waiters -= 1
+        if inflight.waiters == 0 and INFLIGHT_LINTS.get(key) is inflight:
+            del INFLIGHT_LINTS[key]
+
+
+async def _run_lint(
+    document: Document,
+    settings: WorkspaceSettings,
+    executable: Executable,
+    key: LintCacheKey,
+) -> list[Diagnostic]:
+    """Runs Ruff over the document, and caches the resulting diagnostics."""
+    result = await _run_check_on_document(document, settings, executable=executable)
     if result is None:
         return []
 
@@ -614,13 +891,46 @@ async def _lint_document_impl(
             show_error(f"Ruff: Lint failed ({result.stderr.decode('utf-8')})")
         return []
 
+    show_syntax_errors = settings["showSyntaxErrors"]
+    if not result.stdout:
+        diagnostics = []
+    elif len(result.stdout) > PARSE_OUTPUT_EXECUTOR_THRESHOLD:
+        # Parse large outputs off the event loop, to keep handling other requests.
+        diagnostics = await asyncio.get_running_loop().run_in_executor(
+            EXECUTOR, _parse_output, result.stdout, show_syntax_errors
+        )
+    else:
+        diagnostics = _parse_output(result.stdout, show_syntax_errors)
+
+    LINT_CACHE[key] = diagnostics
+    if len(LINT_CACHE) > LINT_CACHE_SIZE:
+        LINT_CACHE.popitem(last=False)
+
+    return diagnostics
+
+
+def _lint_cache_key(
+    document: Document, settings: WorkspaceSettings, executable: Executable
+) -> LintCacheKey:
+    """Returns the key under which the lint results for the document are cached."""
     return (
-        _parse_output(result.stdout, settings.get("showSyntaxErrors", True))
-        if result.stdout
-        else []
+        document.path,
+        hashlib.blake2b(document.encoded_source, digest_size=16).digest(),
+        _settings_fingerprint(settings),
+        executable.path,
+        str(executable.version),
+        CONFIGURATION_GENERATION,
     )
 
 
+def _invalidate_results() -> None:
+    """Discard all cached results, as Ruff's configuration may have changed."""
+    global CONFIGURATION_GENERATION
+    CONFIGURATION_GENERATION += 1
+    LINT_CACHE.clear()
+    FIX_CACHE.clear()
+
+
 def _parse_fix(content: Fix | LegacyFix | None) -> Fix | None:
     """Parse the fix from the Ruff output."""
     if content is None:
@@ -647,8 +957,8 @@ def _parse_fix(content: Fix | LegacyFix | None) -> Fix | None:
         # Since v0.0.266, Ruff returns one based column indices
         if fix.get("applicability") is not None:
             for edit in fix["edits"]:
-                edit["location"]["column"] = edit["location"]["column"] - 1
-                edit["end_location"]["column"] = edit["end_location"]["column"] - 1
+                edit["location"]["column"] -= 1
+                edit["end_location"]["column"] -= 1
 
         return fix
 
@@ -703,69 +1013,99 @@ def _parse_output(content: bytes, show_syntax_errors: bool) -> list[Diagnostic]:
     #
     # Cell represents the cell number in a Notebook Document. It is null for normal
     # Python files.
-    for check in json.loads(content):
-        if not show_syntax_errors and check["code"] is None:
-            continue
+    append = diagnostics.append
+    intern = sys.intern
+    for check in utils.json_loads(content):
+        code = check["code"]
+        if code is None:
+            if not show_syntax_errors:
+                continue
+        else:
+            # Codes repeat across diagnostics, so share a single string per code.
+            code = intern(code)
+        location = check["location"]
+        end_location = check["end_location"]
+        start_row = int(location["row"])
+        end_row = int(end_location["row"])
         start = Position(
-            line=max([int(check["location"]["row"]) - 1, 0]),
-            character=int(check["location"]["column"]) - 1,
+            line=start_row - 1 if start_row > 0 else 0,
+            character=int(location["column"]) - 1,
         )
         end = Position(
-            line=max([int(check["end_location"]["row"]) - 1, 0]),
-            character=int(check["end_location"]["column"]) - 1,
+            line=end_row - 1 if end_row > 0 else 0,
+            character=int(end_location["column"]) - 1,
         )
-        diagnostic = Diagnostic(
-            range=Range(start=start, end=end),
-            message=check.get("message"),
-            code=check["code"],
-            code_description=_get_code_description(check.get("url")),
-            severity=_get_severity(check["code"]),
-            source=TOOL_DISPLAY,
-            data=DiagnosticData(
-                fix=_parse_fix(check.get("fix")),
-                # Available since Ruff v0.0.253.
-                noqa_row=check.get("noqa_row"),
-                # Available since Ruff v0.1.0.
-                cell=check.get("cell"),
-            ),
-            tags=_get_tags(check["code"]),
+        append(
+            Diagnostic(
+                range=Range(start=start, end=end),
+                message=check.get("message"),
+                code=code,
+                code_description=_get_code_description(check.get("url")),
+                severity=_get_severity(code),
+                source=TOOL_DISPLAY,
+                data=DiagnosticData(
+                    fix=_parse_fix(check.get("fix")),
+                    # Available since Ruff v0.0.253.
+                    noqa_row=check.get("noqa_row"),
+                    # Available since Ruff v0.1.0.
+                    cell=check.get("cell"),
+                ),
+                tags=_get_tags(code),
+            )
         )
-        diagnostics.append(diagnostic)
 
     return diagnostics
 
 
+@functools.lru_cache(maxsize=1024)
 def _get_code_description(url: str | None) -> CodeDescription | None:
+    # URLs repeat across diagnostics for the same rule, so share a single instance per
+    # URL.
     if url is None:
         return None
     else:
         return CodeDescription(href=url)
 
 
-def _get_tags(code: str) -> list[DiagnosticTag] | None:
-    if code in {
+# Codes whose diagnostics are tagged as unnecessary code.
+UNNECESSARY_CODES = frozenset(
+    {
         "F401",  # `module` imported but unused
         "F841",  # local variable `name` is assigned to but never used
-    }:
-        return [DiagnosticTag.Unnecessary]
-    return None
-
+    }
+)
+# Shared between diagnostics, and never mutated.
+UNNECESSARY_TAGS = [DiagnosticTag.Unnecessary]
 
-def _get_severity(code: str) -> DiagnosticSeverity:
-    if code in {
+# Codes whose diagnostics are reported as errors, rather than warnings.
+ERROR_CODES = frozenset(
+    {
         "F821",  # undefined name `name`
         "E902",  # `IOError`
         "E999",  # `SyntaxError`
         None,  # `SyntaxError` as of Ruff v0.5.0
-    }:
+    }
+)
+
+
+def _get_tags(code: str) -> list[DiagnosticTag] | None:
+    if code in UNNECESSARY_CODES:
+        return UNNECESSARY_TAGS
+    return None
+
+
+def _get_severity(code: str) -> DiagnosticSeverity:
+    if code in ERROR_CODES:
         return DiagnosticSeverity.Error
     else:
         return DiagnosticSeverity.Warning
 
 
+# Matches `# noqa` comments, optionally followed by a list of codes. The alternating
+# character classes are disjoint, so matching is linear in the length of the line.
 NOQA_REGEX = re.compile(
     r"(?i:# (?:(?:ruff|flake8): )?(?P<noqa>noqa))"
-    r"(?::\s?(?P<codes>([A-Z]+[0-9]+(?:[,\s]+)?)+))?"
+    r"(?::\s?(?P<codes>(?:[A-Z]+[0-9]+(?:[,\s]+)?)+))?"
 )
 CODE_REGEX = re.compile(r"[A-Z]+[0-9]+")
 
@@ -778,7 +1118,12 @@ async def hover(params: HoverParams) -> Hover | None:
     the hover works at the cell level.
     """
     document = LSP_SERVER.workspace.get_text_document(params.text_document.uri)
-    match = NOQA_REGEX.search(document.lines[params.position.line])
+    line = document.lines[params.position.line]
+    # Most lines don't contain a comment, so skip the regex unless there's one.
+    if "#" not in line:
+        return None
+
+    match = NOQA_REGEX.search(line)
     if not match:
         return None
 
@@ -901,13 +1246,24 @@ async def code_action(params: CodeActionParams) -> list[CodeAction] | None:
     document_path = _uri_to_fs_path(params.text_document.uri)
     settings = _get_settings_by_document(document_path)
 
-    if settings.get("ignoreStandardLibrary", True) and utils.is_stdlib_file(
-        document_path
-    ):
+    if settings["ignoreStandardLibrary"] and utils.is_stdlib_file(document_path):
         # Don't format standard library files.
         # Publishing empty list clears the entry.
         return None
 
+    lint_enabled = lint_enable(settings)
+    # The diagnostics reported by Ruff, along with their data.
+    ruff_diagnostics = [
+        (diagnostic, cast(DiagnosticData, diagnostic.data))
+        for diagnostic in params.context.diagnostics
+        if diagnostic.source == "Ruff"
+    ]
+    fixable_diagnostics = [
+        diagnostic
+        for diagnostic, data in ruff_diagnostics
+        if data.get("fix") is not None
+    ]
+
     if settings["organizeImports"]:
         # Generate the "Ruff: Organize Imports" edit
         for kind in (
@@ -940,7 +1296,7 @@ async def code_action(params: CodeActionParams) -> list[CodeAction] | None:
                     return []
 
     # If the linter is enabled, generate the "Ruff: Fix All" edit.
-    if lint_enable(settings) and settings["fixAll"]:
+    if lint_enabled and settings["fixAll"]:
         for kind in (
             CodeActionKind.SourceFixAll,
             SOURCE_FIX_ALL_RUFF,
@@ -963,13 +1319,7 @@ async def code_action(params: CodeActionParams) -> list[CodeAction] | None:
                             kind=kind,
                             data=params.text_document.uri,
                             edit=workspace_edit,
-                            diagnostics=[
-                                diagnostic
-                                for diagnostic in params.context.diagnostics
-                                if diagnostic.source == "Ruff"
-                                and cast(DiagnosticData, diagnostic.data).get("fix")
-                                is not None
-                            ],
+                            diagnostics=fixable_diagnostics,
                         ),
                     ]
                 else:
@@ -977,103 +1327,98 @@ async def code_action(params: CodeActionParams) -> list[CodeAction] | None:
 
     actions: list[CodeAction] = []
 
+    # This is a text document representing either a Python file or a Notebook cell.
+    text_document = LSP_SERVER.workspace.get_text_document(params.text_document.uri)
+
     # If the linter is enabled, add "Ruff: Autofix" for every fixable diagnostic.
-    if lint_enable(settings) and settings.get("codeAction", {}).get(
-        "fixViolation", {}
-    ).get("enable", True):
+    if lint_enabled and fix_violation_enable(settings):
         if not params.context.only or CodeActionKind.QuickFix in params.context.only:
-            # This is a text document representing either a Python file or a
-            # Notebook cell.
-            text_document = LSP_SERVER.workspace.get_text_document(
-                params.text_document.uri
-            )
-            for diagnostic in params.context.diagnostics:
-                if diagnostic.source == "Ruff":
-                    fix = cast(DiagnosticData, diagnostic.data).get("fix")
-                    if fix is not None:
-                        title: str
-                        if fix.get("message"):
-                            title = f"Ruff ({diagnostic.code}): {fix['message']}"
-                        elif diagnostic.code:
-                            title = f"Ruff: Fix {diagnostic.code}"
-                        else:
-                            title = "Ruff: Fix"
-
-                        actions.append(
-                            CodeAction(
-                                title=title,
-                                kind=CodeActionKind.QuickFix,
-                                data=params.text_document.uri,
-                                edit=_create_workspace_edit(
-                                    text_document.uri, text_document.version, fix
-                                ),
-                                diagnostics=[diagnostic],
+            for diagnostic, data in ruff_diagnostics:
+                fix = data.get("fix")
+                if fix is not None:
+                    title: str
+                    if fix.get("message"):
+                        title = f"Ruff ({diagnostic.code}): {fix['message']}"
+                    elif diagnostic.code:
+                        title = _fix_title(diagnostic.code)
+                    else:
+                        title = "Ruff: Fix"
+
+                    actions.append(
+                        CodeAction(
+                            title=title,
+                            kind=CodeActionKind.QuickFix,
+                            data=params.text_document.uri,
+                            edit=_create_workspace_edit(
+                                text_document.uri, text_document.version, fix
                             ),
-                        )
+                            diagnostics=[diagnostic],
+                        ),
+                    )
 
     # If the linter is enabled, add "Disable for this line" for every diagnostic.
-    if lint_enable(settings) and settings.get("codeAction", {}).get(
-        "disableRuleComment", {}
-    ).get("enable", True):
+    if lint_enabled and disable_rule_comment_enable(settings):
         if not params.context.only or CodeActionKind.QuickFix in params.context.only:
-            # This is a text document representing either a Python file or a
-            # Notebook cell.
-            text_document = LSP_SERVER.workspace.get_text_document(
-                params.text_document.uri
-            )
             lines: list[str] | None = None
-            for diagnostic in params.context.diagnostics:
-                if diagnostic.source == "Ruff":
-                    noqa_row = cast(DiagnosticData, diagnostic.data).get("noqa_row")
-                    if noqa_row is not None:
-                        if lines is None:
-                            lines = text_document.lines
-                        line = lines[noqa_row - 1].rstrip("\r\n")
-
-                        match = NOQA_REGEX.search(line)
-                        if match and match.group("codes") is not None:
-                            # `foo  # noqa: OLD` -> `foo  # noqa: OLD,NEW`
-                            codes = match.group("codes") + f", {diagnostic.code}"
-                            start, end = match.start("codes"), match.end("codes")
-                            new_line = line[:start] + codes + line[end:]
-                        elif match:
-                            # `foo  # noqa` -> `foo  # noqa: NEW`
-                            end = match.end("noqa")
-                            new_line = line[:end] + f": {diagnostic.code}" + line[end:]
-                        else:
-                            # `foo` -> `foo  # noqa: NEW`
-                            new_line = f"{line}  # noqa: {diagnostic.code}"
-                        fix = Fix(
-                            message=None,
-                            applicability=None,
-                            edits=[
-                                Edit(
-                                    content=new_line,
-                                    location=Location(
-                                        row=noqa_row,
-                                        column=0,
-                                    ),
-                                    end_location=Location(
-                                        row=noqa_row,
-                                        column=len(line),
-                                    ),
-                                )
-                            ],
-                        )
+            # Diagnostics often share a line, so match each line at most once.
+            noqa_matches: dict[int, re.Match[str] | None] = {}
+            for diagnostic, data in ruff_diagnostics:
+                noqa_row = data.get("noqa_row")
+                if noqa_row is not None:
+                    if lines is None:
+                        lines = text_document.lines
+                    line = lines[noqa_row - 1].rstrip("\r\n")
+
+                    if noqa_row in noqa_matches:
+                        match = noqa_matches[noqa_row]
+                    else:
+                        # A `noqa` directive is always preceded by a `#`.
+                        match = NOQA_REGEX.search(line) if "#" in line else None
+                        noqa_matches[noqa_row] = match
+
+                    if match and match.group("codes") is not None:
+                        # `foo  # noqa: OLD` -> `foo  # noqa: OLD,NEW`
+                        codes = match.group("codes") + f", {diagnostic.code}"
+                        start, end = match.start("codes"), match.end("codes")
+                        new_line = line[:start] + codes + line[end:]
+                    elif match:
+                        # `foo  # noqa` -> `foo  # noqa: NEW`
+                        end = match.end("noqa")
+                        new_line = line[:end] + f": {diagnostic.code}" + line[end:]
+                    else:
+                        # `foo` -> `foo  # noqa: NEW`
+                        new_line = f"{line}  # noqa: {diagnostic.code}"
+                    fix = Fix(
+                        message=None,
+                        applicability=None,
+                        edits=[
+                            Edit(
+                                content=new_line,
+                                location=Location(
+                                    row=noqa_row,
+                                    column=0,
+                                ),
+                                end_location=Location(
+                                    row=noqa_row,
+                                    column=len(line),
+                                ),
+                            )
+                        ],
+                    )
 
-                        title = f"Ruff ({diagnostic.code}): Disable for this line"
+                    title = _disable_for_line_title(diagnostic.code)
 
-                        actions.append(
-                            CodeAction(
-                                title=title,
-                                kind=CodeActionKind.QuickFix,
-                                data=params.text_document.uri,
-                                edit=_create_workspace_edit(
-                                    text_document.uri, text_document.version, fix
-                                ),
-                                diagnostics=[diagnostic],
+                    actions.append(
+                        CodeAction(
+                            title=title,
+                            kind=CodeActionKind.QuickFix,
+                            data=params.text_document.uri,
+                            edit=_create_workspace_edit(
+                                text_document.uri, text_document.version, fix
                             ),
-                        )
+                            diagnostics=[diagnostic],
+                        ),
+                    )
 
     if settings["organizeImports"]:
         # Add "Ruff: Organize Imports" as a supported action.
@@ -1108,7 +1453,7 @@ async def code_action(params: CodeActionParams) -> list[CodeAction] | None:
                     )
 
     # If the linter is enabled, add "Ruff: Fix All" as a supported action.
-    if lint_enable(settings) and settings["fixAll"]:
+    if lint_enabled and settings["fixAll"]:
         if not params.context.only or (
             CodeActionKind.SourceFixAll in params.context.only
         ):
@@ -1134,19 +1479,24 @@ async def code_action(params: CodeActionParams) -> list[CodeAction] | None:
                             kind=CodeActionKind.SourceFixAll,
                             data=params.text_document.uri,
                             edit=workspace_edit,
-                            diagnostics=[
-                                diagnostic
-                                for diagnostic in params.context.diagnostics
-                                if diagnostic.source == "Ruff"
-                                and cast(DiagnosticData, diagnostic.data).get("fix")
-                                is not None
-                            ],
+                            diagnostics=fixable_diagnostics,
                         ),
                     )
 
     return actions if actions else None
 
 
+# The titles are identical for every diagnostic with the same code, so share them.
+@functools.lru_cache(maxsize=None)
+def _fix_title(code: int | str) -> str:
+    return f"Ruff: Fix {code}"
+
+
+@functools.lru_cache(maxsize=None)
+def _disable_for_line_title(code: int | str | None) -> str:
+    return f"Ruff ({code}): Disable for this line"
+
+
 @LSP_SERVER.feature(CODE_ACTION_RESOLVE)
 async def resolve_code_action(params: CodeAction) -> CodeAction:
     """LSP handler for codeAction/resolve request."""
@@ -1283,9 +1633,7 @@ async def _format_document_impl(
     if document.kind is DocumentKind.Cell:
         return _result_single_cell_notebook_to_edits(document, result)
     else:
-        return _fixed_source_to_edits(
-            original_source=document.source, fixed_source=result.stdout.decode("utf-8")
-        )
+        return _stdout_to_edits(document, result.stdout)
 
 
 async def _fix_document_impl(
@@ -1294,11 +1642,41 @@ async def _fix_document_impl(
     *,
     only: Sequence[str] | None = None,
 ) -> WorkspaceEdit | None:
+    if settings["ignoreStandardLibrary"] and document.is_stdlib_file():
+        log_warning(f"Skipping standard library file: {document.path}")
+        return None
+
+    executable = _find_ruff_binary(settings, VERSION_REQUIREMENT_LINTER)
+    lint_key = _lint_cache_key(document, settings, executable)
+    if only is None:
+        # If linting the same source with the same settings, executable, and
+        # configuration found nothing to fix, Ruff would leave the document unchanged.
+        diagnostics = LINT_CACHE.get(lint_key)
+        if diagnostics is not None and all(
+            cast(DiagnosticData, diagnostic.data).get("fix") is None
+            for diagnostic in diagnostics
+        ):
+            return None
+
+    # The same fixes are often requested repeatedly for an unchanged document (e.g.,
+    # when resolving the code actions offered for it).
+    key = (
+        document.uri,
+        document.version,
+        lint_key,
+        tuple(only) if only is not None else None,
+    )
+    workspace_edit = FIX_CACHE.get(key)
+    if workspace_edit is not None:
+        FIX_CACHE.move_to_end(key)
+        return workspace_edit
+
     result = await _run_check_on_document(
         document,
         settings,
         extra_args=["--fix"],
         only=only,
+        executable=executable,
     )
 
     if result is None:
@@ -1312,7 +1690,12 @@ async def _fix_document_impl(
             show_error(f"Ruff: Fix failed ({result.stderr.decode('utf-8')})")
         return None
 
-    return _result_to_workspace_edit(document, result)
+    workspace_edit = _result_to_workspace_edit(document, result)
+    if workspace_edit is not None:
+        FIX_CACHE[key] = workspace_edit
+        if len(FIX_CACHE) > FIX_CACHE_SIZE:
+            FIX_CACHE.popitem(last=False)
+    return workspace_edit
 
 
 def _result_to_workspace_edit(
@@ -1329,9 +1712,7 @@ def _result_to_workspace_edit(
             return None
 
     if document.kind is DocumentKind.Text:
-        edits = _fixed_source_to_edits(
-            original_source=document.source, fixed_source=result.stdout.decode("utf-8")
-        )
+        edits = _stdout_to_edits(document, result.stdout)
         return WorkspaceEdit(
             document_changes=[
                 _create_text_document_edit(document.uri, document.version, edits)
@@ -1345,9 +1726,7 @@ def _result_to_workspace_edit(
             log_warning(f"No notebook document found for {document.uri!r}")
             return None
 
-        output_notebook_cells = cast(
-            Notebook, json.loads(result.stdout.decode("utf-8"))
-        )["cells"]
+        output_notebook_cells = cast(Notebook, utils.json_loads(result.stdout))["cells"]
         if len(output_notebook_cells) != len(notebook_document.cells):
             log_warning(
                 f"Number of cells in the output notebook doesn't match the number of "
@@ -1365,6 +1744,9 @@ def _result_to_workspace_edit(
                 original_source=cell_document.source,
                 fixed_source=output_notebook_cells[cell_idx]["source"],
             )
+            if not edits:
+                # Leave the cells that Ruff didn't change out of the edit.
+                continue
             cell_document_changes.append(
                 _create_text_document_edit(
                     cell_document.uri,
@@ -1394,7 +1776,7 @@ def _result_single_cell_notebook_to_edits(
 
     The result is expected to be a single cell Notebook Document.
     """
-    output_notebook = cast(Notebook, json.loads(result.stdout.decode("utf-8")))
+    output_notebook = cast(Notebook, utils.json_loads(result.stdout))
     # The input notebook contained only one cell, so the output notebook should
     # also contain only one cell.
     output_cell = next(iter(output_notebook["cells"]), None)
@@ -1411,6 +1793,17 @@ def _result_single_cell_notebook_to_edits(
     )
 
 
+def _stdout_to_edits(document: Document, stdout: bytes) -> list[TextEdit]:
+    """Converts Ruff's output for a Python file to a list of TextEdits."""
+    # Most runs leave the document unchanged, so compare the raw output first to avoid
+    # decoding it.
+    if stdout == document.encoded_source:
+        return []
+    return _fixed_source_to_edits(
+        original_source=document.source, fixed_source=stdout.decode("utf-8")
+    )
+
+
 def _fixed_source_to_edits(
     *, original_source: str, fixed_source: str | list[str]
 ) -> list[TextEdit]:
@@ -1422,6 +1815,10 @@ def _fixed_source_to_edits(
     if isinstance(fixed_source, list):
         fixed_source = "".join(fixed_source)
 
+    # Avoid scanning for line endings in the common case where nothing changed.
+    if fixed_source == original_source:
+        return []
+
     new_source = _match_line_endings(original_source, fixed_source)
 
     if new_source == original_source:
@@ -1440,22 +1837,34 @@ def _fixed_source_to_edits(
     new_lines = new_source.splitlines(True)
     original_lines = original_source.splitlines(True)
 
-    start_offset = 0
-    end_offset = 0
+    common_lines = min(len(new_lines), len(original_lines))
 
-    for new_line, original_line in zip(new_lines, original_lines):
-        if new_line == original_line:
-            start_offset += 1
-        else:
-            break
+    # The number of leading lines that are unchanged.
+    start_offset = next(
+        (
+            offset
+            for offset, (new_line, original_line) in enumerate(
+                zip(new_lines, original_lines)
+            )
+            if new_line != original_line
+        ),
+        common_lines,
+    )
 
-    for new_line, original_line in zip(
-        reversed(new_lines[start_offset:]), reversed(original_lines[start_offset:])
-    ):
-        if new_line == original_line:
-            end_offset += 1
-        else:
-            break
+    # The number of trailing lines that are unchanged, excluding the leading lines.
+    max_end_offset = common_lines - start_offset
+    end_offset = next(
+        (
+            offset
+            for offset, (new_line, original_line) in enumerate(
+                itertools.islice(
+                    zip(reversed(new_lines), reversed(original_lines)), max_end_offset
+                )
+            )
+            if new_line != original_line
+        ),
+        max_end_offset,
+    )
 
     trimmed_new_source = "".join(new_lines[start_offset : len(new_lines) - end_offset])
 
@@ -1513,15 +1922,13 @@ def _create_workspace_edit(uri: str, version: int | None, fix: Fix) -> Workspace
 
 def _get_line_endings(text: str) -> str | None:
     """Returns line endings used in the text."""
-    for i in range(len(text)):
-        if text[i] == "\r":
-            if i < len(text) - 1 and text[i + 1] == "\n":
-                return "\r\n"  # CLRF
-            else:
-                return "\r"  # CR
-        elif text[i] == "\n":
-            return "\n"  # LF
-    return None  # No line ending found
+    lf = text.find("\n")
+    # Only the first line break matters, so don't scan the rest of an LF-only text
+    # for a `\r`.
+    cr = text.find("\r", 0, lf) if lf != -1 else text.find("\r")
+    if cr == -1:
+        return None if lf == -1 else "\n"  # LF
+    return "\r\n" if lf == cr + 1 else "\r"  # CRLF or CR
 
 
 def _match_line_endings(original_source: str, fixed_source: str) -> str:
@@ -1537,11 +1944,16 @@ async def run_path(
     program: str,
     argv: Sequence[str],
     *,
-    source: str,
+    source: str | bytes,
     cwd: str | None = None,
 ) -> RunResult:
     """Runs as an executable."""
-    log_to_output(f"Running Ruff with: {program} {argv}")
+    # The executable and its arguments are included in bug reports, so log them
+    # regardless of the `logLevel` setting.
+    log_to_output("Running Ruff with: %s %s", program, argv, always=True)
+
+    if isinstance(source, str):
+        source = source.encode("utf-8")
 
     process = await asyncio.create_subprocess_exec(
         program,
@@ -1551,13 +1963,22 @@ async def run_path(
         stdin=asyncio.subprocess.PIPE,
         cwd=cwd,
     )
-    result = RunResult(
-        *await process.communicate(input=source.encode("utf-8")),
-        exit_code=await process.wait(),
-    )
+    try:
+        result = RunResult(
+            *await process.communicate(input=source),
+            exit_code=await process.wait(),
+        )
+    except asyncio.CancelledError:
+        # The request was cancelled by the client, or the lint was superseded by a
+        # more recent change: don't leave Ruff running in the background.
+        with contextlib.suppress(ProcessLookupError):
+            process.terminate()
+        raise
 
     if result.stderr:
-        log_to_output(result.stderr.decode("utf-8"))
+        # Forward Ruff's own messages (e.g., configuration warnings) regardless of the
+        # `logLevel` setting.
+        LSP_SERVER.show_message_log(result.stderr.decode("utf-8"), MessageType.Log)
 
     return result
 
@@ -1586,13 +2007,9 @@ def initialize(params: InitializeParams) -> None:
     )
 
     log_to_output(
-        f"Workspace settings: "
-        f"{json.dumps(workspace_settings, indent=4, ensure_ascii=False)}"
-    )
-    log_to_output(
-        f"Global settings: "
-        f"{json.dumps(global_settings, indent=4, ensure_ascii=False)}"
+        f"Workspace settings: {utils.json_dumps(workspace_settings, pretty=True)}"
     )
+    log_to_output(f"Global settings: {utils.json_dumps(global_settings, pretty=True)}")
 
     # Preserve any "global" settings.
     if global_settings:
@@ -1634,7 +2051,12 @@ def _supports_code_action_resolve(capabilities: ClientCapabilities) -> bool:
 ###
 
 
+@functools.lru_cache(maxsize=None)
 def _get_global_defaults() -> UserSettings:
+    """Returns the defaults derived from `GLOBAL_SETTINGS`.
+
+    The result is shared between callers, which must copy it before making changes.
+    """
     settings: UserSettings = {
         "codeAction": GLOBAL_SETTINGS.get("codeAction", {}),
         "fixAll": GLOBAL_SETTINGS.get("fixAll", True),
@@ -1646,6 +2068,7 @@ def _get_global_defaults() -> UserSettings:
         "logLevel": GLOBAL_SETTINGS.get("logLevel", "error"),
         "organizeImports": GLOBAL_SETTINGS.get("organizeImports", True),
         "path": GLOBAL_SETTINGS.get("path", []),
+        "showSyntaxErrors": GLOBAL_SETTINGS.get("showSyntaxErrors", True),
     }
 
     # Deprecated: use `lint.args` instead.
@@ -1660,6 +2083,17 @@ def _get_global_defaults() -> UserSettings:
 
 
 def _update_workspace_settings(settings: list[WorkspaceSettings]) -> None:
+    # Any previously resolved document settings may now be stale.
+    DOCUMENT_SETTINGS.clear()
+    DIRECTORY_SETTINGS.clear()
+    SETTINGS_FINGERPRINTS.clear()
+    _invalidate_results()
+    _update_log_level(settings)
+    # Re-resolve executables, e.g., to pick up a newly activated environment.
+    BINARY_PATHS.clear()
+    # `GLOBAL_SETTINGS` is updated ahead of the workspace settings.
+    _get_global_defaults.cache_clear()
+
     if not settings:
         workspace_path = os.getcwd()
         WORKSPACE_SETTINGS[workspace_path] = {
@@ -1691,28 +2125,56 @@ def _update_workspace_settings(settings: list[WorkspaceSettings]) -> None:
             }
 
 
-def _get_document_key(document_path: str) -> str | None:
-    document_workspace = Path(document_path)
-    workspaces = {s["workspacePath"] for s in WORKSPACE_SETTINGS.values()}
+def _settings_fingerprint(settings: WorkspaceSettings) -> str:
+    """Returns a string that uniquely identifies the given settings."""
+    # Resolved settings are shared between documents and never mutated, so the
+    # fingerprint only needs to be computed once per settings dict.
+    cached = SETTINGS_FINGERPRINTS.get(id(settings))
+    if cached is not None and cached[0] is settings:
+        return cached[1]
+
+    fingerprint = json.dumps(settings, sort_keys=True, default=str)
+    SETTINGS_FINGERPRINTS[id(settings)] = (settings, fingerprint)
+    return fingerprint
+
 
-    while document_workspace != document_workspace.parent:
-        if str(document_workspace) in workspaces:
-            return str(document_workspace)
-        document_workspace = document_workspace.parent
+def _get_document_key(document_path: str) -> str | None:
+    # Normalize the path once, then walk its ancestors as strings (up to, but
+    # excluding, the root).
+    document_workspace = os.fspath(Path(document_path))
+    parent = os.path.dirname(document_workspace)
+
+    # `WORKSPACE_SETTINGS` is keyed by the `workspacePath` of each workspace.
+    while document_workspace != parent:
+        if document_workspace in WORKSPACE_SETTINGS:
+            return document_workspace
+        document_workspace, parent = parent, os.path.dirname(parent)
     return None
 
 
 def _get_settings_by_document(document_path: str) -> WorkspaceSettings:
+    settings = DOCUMENT_SETTINGS.get(document_path)
+    if settings is None:
+        settings = DOCUMENT_SETTINGS[document_path] = _resolve_document_settings(
+            document_path
+        )
+    return settings
+
+
+def _resolve_document_settings(document_path: str) -> WorkspaceSettings:
     key = _get_document_key(document_path)
     if key is None:
         # This is either a non-workspace file or there is no workspace.
         workspace_path = os.fspath(Path(document_path).parent)
-        return {
-            **_get_global_defaults(),  # type: ignore[misc]
-            "cwd": None,
-            "workspacePath": workspace_path,
-            "workspace": uris.from_fs_path(workspace_path),
-        }
+        settings = DIRECTORY_SETTINGS.get(workspace_path)
+        if settings is None:
+            settings = DIRECTORY_SETTINGS[workspace_path] = {
+                **_get_global_defaults(),  # type: ignore[misc]
+                "cwd": None,
+                "workspacePath": workspace_path,
+                "workspace": uris.from_fs_path(workspace_path),
+            }
+        return settings
 
     return WORKSPACE_SETTINGS[str(key)]
 
@@ -1754,14 +2216,21 @@ def _find_ruff_binary(
     """
     path = _find_ruff_binary_path(settings)
 
-    version = _executable_version(path)
+    try:
+        version = _executable_version(path)
+    except FileNotFoundError:
+        # The executable was removed since it was found (e.g., along with its virtual
+        # environment), so search for it again.
+        _forget_ruff_binary_path(path)
+        path = _find_ruff_binary_path(settings)
+        version = _executable_version(path)
     if version_requirement and not version_requirement.contains(
         version, prereleases=True
     ):
         message = f"Ruff {version_requirement} required, but found {version} at {path}"
         show_error(message)
         raise RuntimeError(message)
-    log_to_output(f"Found ruff {version} at {path}")
+    log_to_output("Found ruff %s at %s", version, path, always=True)
 
     return Executable(path, version)
 
@@ -1769,23 +2238,53 @@ def _find_ruff_binary(
 def _find_ruff_binary_path(settings: WorkspaceSettings) -> str:
     """Returns the path to the executable."""
     bundle = get_bundle()
+    key = (
+        tuple(utils.as_list(settings["path"])),
+        settings["importStrategy"],
+        tuple(settings["interpreter"] or ()),
+        bundle,
+    )
+    path = BINARY_PATHS.get(key)
+    if path is None:
+        path = _resolve_ruff_binary_path(settings, bundle)
+        # Only cache executables that exist, such that a later installation is picked
+        # up.
+        if os.path.exists(path):
+            BINARY_PATHS[key] = path
+    return path
+
+
+def _forget_ruff_binary_path(path: str) -> None:
+    """Removes the given executable from the cached executable paths and versions."""
+    for key in [key for key, cached in BINARY_PATHS.items() if cached == path]:
+        del BINARY_PATHS[key]
+    EXECUTABLE_VERSIONS.pop(path, None)
+
 
+@functools.lru_cache(maxsize=32)
+def _resolve_user_path(path: str) -> str:
+    """Expands environment variables and `~` in a user-provided path."""
+    return os.path.expanduser(os.path.expandvars(path))
+
+
+def _resolve_ruff_binary_path(settings: WorkspaceSettings, bundle: str | None) -> str:
+    """Searches for the executable, based on the given settings."""
     if settings["path"]:
         # 'path' setting takes priority over everything.
         paths = settings["path"]
         if isinstance(paths, str):
             paths = [paths]
         for path in paths:
-            path = os.path.expanduser(os.path.expandvars(path))
+            path = _resolve_user_path(path)
             if os.path.exists(path):
-                log_to_output(f"Using 'path' setting: {path}")
+                log_to_output("Using 'path' setting: %s", path)
                 return path
         else:
-            log_to_output(f"Could not find executable in 'path': {settings['path']}")
+            log_to_output("Could not find executable in 'path': %s", settings["path"])
 
     if settings["importStrategy"] == "useBundled" and bundle:
         # If we're loading from the bundle, use the absolute path.
-        log_to_output(f"Using bundled executable: {bundle}")
+        log_to_output("Using bundled executable: %s", bundle)
         return bundle
 
     if settings["interpreter"] and not utils.is_current_interpreter(
@@ -1794,48 +2293,52 @@ def _find_ruff_binary_path(settings: WorkspaceSettings) -> str:
         # If there is a different interpreter set, find its script path.
         if settings["interpreter"][0] not in INTERPRETER_PATHS:
             INTERPRETER_PATHS[settings["interpreter"][0]] = utils.scripts(
-                os.path.expanduser(os.path.expandvars(settings["interpreter"][0]))
+                _resolve_user_path(settings["interpreter"][0])
             )
 
         path = os.path.join(INTERPRETER_PATHS[settings["interpreter"][0]], TOOL_MODULE)
     else:
-        path = os.path.join(sysconfig.get_path("scripts"), TOOL_MODULE)
+        path = TOOL_SCRIPT_PATH
 
     # First choice: the executable in the current interpreter's scripts directory.
     if os.path.exists(path):
-        log_to_output(f"Using interpreter executable: {path}")
+        log_to_output("Using interpreter executable: %s", path)
         return path
     else:
-        log_to_output(f"Interpreter executable ({path}) not found")
+        log_to_output("Interpreter executable (%s) not found", path)
 
     # Second choice: the executable in the global environment.
     environment_path = shutil.which("ruff")
     if environment_path:
-        log_to_output(f"Using environment executable: {environment_path}")
+        log_to_output("Using environment executable: %s", environment_path)
         return environment_path
 
     # Third choice: bundled executable.
     if bundle:
-        log_to_output(f"Falling back to bundled executable: {bundle}")
+        log_to_output("Falling back to bundled executable: %s", bundle)
         return bundle
 
     # Last choice: just return the expected path for the current interpreter.
-    log_to_output(f"Unable to find interpreter executable: {path}")
+    log_to_output("Unable to find interpreter executable: %s", path)
     return path
 
 
 def _executable_version(executable: str) -> Version:
     """Returns the version of the executable."""
+    cached = EXECUTABLE_VERSIONS.get(executable)
+    now = time.monotonic()
+    if cached is not None and now - cached.checked_at < EXECUTABLE_VERSION_TTL:
+        return cached.version
+
     # If the user change the file (e.g. `pip install -U ruff`), invalidate the cache
-    modified = Path(executable).stat().st_mtime
-    if (
-        executable not in EXECUTABLE_VERSIONS
-        or EXECUTABLE_VERSIONS[executable].modified != modified
-    ):
+    modified = os.stat(executable).st_mtime
+    if cached is None or cached.modified != modified:
         version = utils.version(executable)
-        log_to_output(f"Inferred version {version} for: {executable}")
-        EXECUTABLE_VERSIONS[executable] = VersionModified(version, modified)
-    return EXECUTABLE_VERSIONS[executable].version
+        log_to_output("Inferred version %s for: %s", version, executable)
+    else:
+        version = cached.version
+    EXECUTABLE_VERSIONS[executable] = VersionModified(version, modified, now)
+    return version
 
 
 async def _run_check_on_document(
@@ -1844,48 +2347,25 @@ async def _run_check_on_document(
     *,
     extra_args: Sequence[str] = [],
     only: Sequence[str] | None = None,
+    executable: Executable | None = None,
 ) -> ExecutableResult | None:
-    """Runs the Ruff `check` subcommand  on the given document source."""
-    if settings.get("ignoreStandardLibrary", True) and document.is_stdlib_file():
+    """Runs the Ruff `check` subcommand  on the given document source.
+
+    If not provided, the executable is resolved from the settings.
+    """
+    if settings["ignoreStandardLibrary"] and document.is_stdlib_file():
         log_warning(f"Skipping standard library file: {document.path}")
         return None
 
-    executable = _find_ruff_binary(settings, VERSION_REQUIREMENT_LINTER)
+    if executable is None:
+        executable = _find_ruff_binary(settings, VERSION_REQUIREMENT_LINTER)
     argv: list[str] = CHECK_ARGS + list(extra_args)
-
-    skip_next_arg = False
-    for arg in lint_args(settings):
-        if skip_next_arg:
-            skip_next_arg = False
-            continue
-        if arg in UNSUPPORTED_CHECK_ARGS:
-            log_to_output(f"Ignoring unsupported argument: {arg}")
-            continue
-        # If we're trying to run a single rule, we need to make sure to skip any of the
-        # arguments that would override it.
-        if only is not None:
-            # Case 1: Option and its argument as separate items
-            # (e.g. `["--select", "F821"]`).
-            if arg in ("--select", "--extend-select", "--ignore", "--extend-ignore"):
-                # Skip the following argument assuming it's a list of rules.
-                skip_next_arg = True
-                continue
-            # Case 2: Option and its argument as a single item
-            # (e.g. `["--select=F821"]`).
-            elif arg.startswith(
-                ("--select=", "--extend-select=", "--ignore=", "--extend-ignore=")
-            ):
-                continue
-        argv.append(arg)
+    argv.extend(_filter_lint_args(tuple(lint_args(settings)), only is not None))
 
     # If the Ruff version is not sufficiently recent, use the deprecated `--format`
     # argument instead of `--output-format`.
-    if not VERSION_REQUIREMENT_OUTPUT_FORMAT.contains(
-        executable.version, prereleases=True
-    ):
-        index = argv.index("--output-format")
-        argv.pop(index)
-        argv.insert(index, "--format")
+    if not _supports_output_format(executable.version):
+        argv[OUTPUT_FORMAT_INDEX] = "--format"
 
     # If we're trying to run a single rule, add it to the command line.
     if only is not None:
@@ -1901,16 +2381,67 @@ async def _run_check_on_document(
             executable.path,
             argv,
             cwd=settings["cwd"],
-            source=document.source,
+            source=document.encoded_source,
         ),
     )
 
 
+@functools.lru_cache(maxsize=None)
+def _supports_output_format(version: Version) -> bool:
+    """Returns True if the given Ruff version supports the `--output-format` option."""
+    return VERSION_REQUIREMENT_OUTPUT_FORMAT.contains(version, prereleases=True)
+
+
+@functools.lru_cache(maxsize=64)
+def _filter_lint_args(args: tuple[str, ...], has_only: bool) -> tuple[str, ...]:
+    """Returns the user-provided `check` arguments that are passed on to Ruff.
+
+    The result only depends on the arguments, so unsupported arguments are only
+    reported the first time they're encountered.
+    """
+    filtered: list[str] = []
+    skip_next_arg = False
+    for arg in args:
+        if skip_next_arg:
+            skip_next_arg = False
+            continue
+        if arg in UNSUPPORTED_CHECK_ARGS:
+            log_to_output("Ignoring unsupported argument: %s", arg)
+            continue
+        # If we're trying to run a single rule, we need to make sure to skip any of the
+        # arguments that would override it.
+        if has_only:
+            # Case 1: Option and its argument as separate items
+            # (e.g. `["--select", "F821"]`).
+            if arg in RULE_SELECTION_OPTIONS:
+                # Skip the following argument assuming it's a list of rules.
+                skip_next_arg = True
+                continue
+            # Case 2: Option and its argument as a single item
+            # (e.g. `["--select=F821"]`).
+            elif arg.startswith(RULE_SELECTION_PREFIXES):
+                continue
+        filtered.append(arg)
+    return tuple(filtered)
+
+
+@functools.lru_cache(maxsize=64)
+def _filter_format_args(args: tuple[str, ...]) -> tuple[str, ...]:
+    """Returns the user-provided `format` arguments that are passed on to Ruff."""
+    filtered: list[str] = []
+    for arg in args:
+        if arg in UNSUPPORTED_FORMAT_ARGS:
+            log_to_output("Ignoring unsupported argument: %s", arg)
+        else:
+            filtered.append(arg)
+    return tuple(filtered)
+
+
 async def _run_format_on_document(
     document: Document, settings: WorkspaceSettings, format_range: Range | None = None
 ) -> ExecutableResult | None:
     """Runs the Ruff `format` subcommand on the given document source."""
-    if settings.get("ignoreStandardLibrary", True) and document.is_stdlib_file():
+    if settings["ignoreStandardLibrary"] and document.is_stdlib_file():
         log_warning(f"Skipping standard library file: {document.path}")
         return None
 
@@ -1929,10 +2460,13 @@ async def _run_format_on_document(
     ]
 
     if format_range:
-        codec = PositionCodec(PositionEncodingKind.Utf16)
-        format_range = codec.range_from_client_units(
-            document.source.splitlines(True), format_range
-        )
+        # For ASCII-only sources, UTF-16 code units and code points coincide, so there's
+        # no need to split the source into lines to convert the range. (Ruff clamps any
+        # out-of-bounds positions itself.)
+        if not document.source.isascii():
+            format_range = UTF16_CODEC.range_from_client_units(
+                document.source.splitlines(True), format_range
+            )
 
         argv.extend(
             [
@@ -1941,11 +2475,7 @@ async def _run_format_on_document(
             ]
         )
 
-    for arg in settings.get("format", {}).get("args", []):
-        if arg in UNSUPPORTED_FORMAT_ARGS:
-            log_to_output(f"Ignoring unsupported argument: {arg}")
-        else:
-            argv.append(arg)
+    argv.extend(_filter_format_args(tuple(settings["format"].get("args", []))))
 
     return ExecutableResult(
         executable,
@@ -1953,7 +2483,7 @@ async def _run_format_on_document(
             executable.path,
             argv,
             cwd=settings["cwd"],
-            source=document.source,
+            source=document.encoded_source,
         ),
     )
 
@@ -1986,7 +2516,33 @@ async def _run_subcommand_on_document(
 ###
 
 
-def log_to_output(message: str) -> None:
+# Whether to send debug logs to the client. Disabled if the `logLevel` setting is above
+# `info` (as it is by default) for every workspace.
+_LOG_TO_OUTPUT = True
+# The `logLevel` values that disable debug logs.
+QUIET_LOG_LEVELS = frozenset({"error", "warn", "warning"})
+
+
+def _update_log_level(settings: Sequence[UserSettings]) -> None:
+    """Enables or disables debug logs based on the `logLevel` setting of each
+    workspace, falling back to the global setting."""
+    global _LOG_TO_OUTPUT
+    default = GLOBAL_SETTINGS.get("logLevel", "error")
+    log_levels = [setting.get("logLevel", default) for setting in settings] or [default]
+    _LOG_TO_OUTPUT = any(level not in QUIET_LOG_LEVELS for level in log_levels)
+
+
+def log_to_output(message: str, *args: object, always: bool = False) -> None:
+    """Log a debug message to the client.
+
+    If any `args` are given, the message is %-formatted with them, but only if it's
+    actually sent. Unless `always` is set, the message is only sent if enabled by
+    the `logLevel` setting.
+    """
+    if not (_LOG_TO_OUTPUT or always):
+        return
+    if args:
+        message = message % args
     LSP_SERVER.show_message_log(message, MessageType.Log)
 
 
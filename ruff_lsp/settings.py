@@ -4,6 +4,10 @@ import enum
 
 from typing_extensions import Literal, TypedDict
 
+# The default delay (in milliseconds) before linting a document on change, such that
+# bursts of keystrokes are coalesced into a single Ruff invocation.
+LINT_DEBOUNCE_MS = 20
+
 
 @enum.unique
 class Run(str, enum.Enum):
@@ -95,6 +99,9 @@ class Lint(TypedDict, total=False):
     run: Run
     """Run Ruff on every keystroke (`onType`) or on save (`onSave`)."""
 
+    debounce: int
+    """The delay (in milliseconds) before linting on change, when running `onType`."""
+
 
 class Format(TypedDict, total=False):
     args: list[str]
@@ -121,9 +128,35 @@ def lint_run(settings: UserSettings) -> Run:
         return Run.OnType
 
 
+def lint_debounce(settings: UserSettings) -> int:
+    """Get the `lint.debounce` setting from the user settings."""
+    if "lint" in settings and "debounce" in settings["lint"]:
+        debounce = settings["lint"]["debounce"]
+        # Fall back to the default for anything but an integer (e.g., `"150"`).
+        if isinstance(debounce, int) and not isinstance(debounce, bool):
+            return max(debounce, 0)
+    return LINT_DEBOUNCE_MS
+
+
 def lint_enable(settings: UserSettings) -> bool:
     """Get the `lint.enable` setting from the user settings."""
     if "lint" in settings and "enable" in settings["lint"]:
         return settings["lint"]["enable"]
     else:
         return True
+
+
+def fix_violation_enable(settings: UserSettings) -> bool:
+    """Get the `codeAction.fixViolation.enable` setting from the user settings."""
+    if "codeAction" in settings and "fixViolation" in settings["codeAction"]:
+        return settings["codeAction"]["fixViolation"].get("enable", True)
+    else:
+        return True
+
+
+def disable_rule_comment_enable(settings: UserSettings) -> bool:
+    """Get the `codeAction.disableRuleComment.enable` setting from the user settings."""
+    if "codeAction" in settings and "disableRuleComment" in settings["codeAction"]:
+        return settings["codeAction"]["disableRuleComment"].get("enable", True)
+    else:
+        return True
@@ -2,6 +2,8 @@
 
 from __future__ import annotations
 
+import functools
+import json
 import os
 import os.path
 import pathlib
@@ -13,6 +15,11 @@ from typing import Any, NamedTuple
 
 from packaging.version import Version
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore[assignment]
+
 
 def as_list(content: Any | list[Any] | tuple[Any, ...]) -> list[Any]:
     """Ensures we always get a list"""
@@ -21,6 +28,26 @@ def as_list(content: Any | list[Any] | tuple[Any, ...]) -> list[Any]:
     return [content]
 
 
+def json_loads(content: str | bytes) -> Any:
+    """Deserializes a JSON document, using `orjson` if it's installed."""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def json_dumps(obj: Any, *, pretty: bool = False) -> str:
+    """Serializes an object to a JSON string, using `orjson` if it's installed.
+
+    If `pretty` is set, the output is indented with two spaces.
+    """
+    if orjson is not None:
+        option = orjson.OPT_INDENT_2 if pretty else None
+        return orjson.dumps(obj, option=option).decode("utf-8")
+    if pretty:
+        return json.dumps(obj, indent=2, ensure_ascii=False)
+    return json.dumps(obj)
+
+
 def _get_sys_config_paths() -> list[str]:
     """Returns paths from sysconfig.get_paths()."""
     return [
@@ -44,13 +71,15 @@ def _get_extensions_dir() -> list[str]:
     return []
 
 
-_stdlib_paths = set(
-    str(pathlib.Path(p).resolve())
-    for p in (
-        as_list(site.getsitepackages())
-        + as_list(site.getusersitepackages())
-        + _get_sys_config_paths()
-        + _get_extensions_dir()
+_stdlib_paths = tuple(
+    set(
+        str(pathlib.Path(p).resolve())
+        for p in (
+            as_list(site.getsitepackages())
+            + as_list(site.getusersitepackages())
+            + _get_sys_config_paths()
+            + _get_extensions_dir()
+        )
     )
 )
 
@@ -65,15 +94,17 @@ def normalize_path(file_path: str) -> str:
     return str(pathlib.Path(file_path).resolve())
 
 
+@functools.lru_cache(maxsize=8)
 def is_current_interpreter(executable: str) -> bool:
     """Returns true if the executable path is same as the current interpreter."""
     return is_same_path(executable, sys.executable)
 
 
+@functools.lru_cache(maxsize=4096)
 def is_stdlib_file(file_path: str) -> bool:
     """Return True if the file belongs to the standard library."""
     normalized_path = str(pathlib.Path(file_path).resolve())
-    return any(normalized_path.startswith(path) for path in _stdlib_paths)
+    return normalized_path.startswith(_stdlib_paths)
 
 
 def scripts(interpreter: str) -> str:
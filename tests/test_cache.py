@@ -0,0 +1,418 @@
+"""Tests for the caches that avoid redundant work across requests."""
+
+from __future__ import annotations
+
+import asyncio
+import shutil
+from pathlib import Path
+from typing import Any
+
+import pytest
+from lsprotocol.types import (
+    CodeAction,
+    CodeActionContext,
+    CodeActionKind,
+    CodeActionParams,
+    Diagnostic,
+    DidSaveTextDocumentParams,
+    Position,
+    Range,
+    TextDocumentEdit,
+    TextDocumentIdentifier,
+    TextDocumentItem,
+)
+from pygls.workspace import Workspace
+
+from ruff_lsp import server
+from ruff_lsp.server import (
+    BINARY_PATHS,
+    EXECUTABLE_VERSIONS,
+    FIX_CACHE,
+    INFLIGHT_LINTS,
+    LINT_CACHE,
+    LSP_SERVER,
+    PUBLISHED_DIAGNOSTICS,
+    TOOL_MODULE,
+    Document,
+    DocumentKind,
+    _find_ruff_binary,
+    _fix_document_impl,
+    _get_global_defaults,
+    _invalidate_results,
+    _lint_document_impl,
+    _publish_diagnostics,
+    code_action,
+    did_save,
+    uris,
+)
+from ruff_lsp.settings import WorkspaceSettings
+
+SOURCE = """import os
+import sys
+
+print(sys.argv)
+"""
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    yield
+    BINARY_PATHS.clear()
+    EXECUTABLE_VERSIONS.clear()
+    LINT_CACHE.clear()
+    INFLIGHT_LINTS.clear()
+    FIX_CACHE.clear()
+    PUBLISHED_DIAGNOSTICS.clear()
+
+
+@pytest.fixture
+def ruff_runs(monkeypatch) -> list[Document]:
+    """Records the documents that Ruff is run against."""
+    runs: list[Document] = []
+    run_check_on_document = server._run_check_on_document
+
+    async def _run_check_on_document(document, settings, **kwargs):
+        runs.append(document)
+        return await run_check_on_document(document, settings, **kwargs)
+
+    monkeypatch.setattr(server, "_run_check_on_document", _run_check_on_document)
+    return runs
+
+
+@pytest.fixture
+def text_document_uri(tmp_path, monkeypatch) -> str:
+    """Opens a Python file in a fresh workspace, and returns its URI."""
+    workspace = Workspace(uris.from_fs_path(str(tmp_path)))
+    monkeypatch.setattr(LSP_SERVER.lsp, "_workspace", workspace)
+
+    path = tmp_path.joinpath("main.py")
+    path.write_text(SOURCE)
+    uri = uris.from_fs_path(str(path))
+    workspace.put_text_document(
+        TextDocumentItem(uri=uri, language_id="python", version=1, text=SOURCE)
+    )
+    return uri
+
+
+@pytest.fixture
+def published(monkeypatch) -> list[tuple[str, list[Diagnostic]]]:
+    """Records the diagnostics published to the client."""
+    published: list[tuple[str, list[Diagnostic]]] = []
+    monkeypatch.setattr(
+        LSP_SERVER,
+        "publish_diagnostics",
+        lambda uri, diagnostics: published.append((uri, diagnostics)),
+    )
+    return published
+
+
+def _workspace_settings(workspace_path: str, **overrides) -> WorkspaceSettings:
+    return WorkspaceSettings(  # type: ignore[misc]
+        **{
+            **_get_global_defaults(),
+            "cwd": None,
+            "workspacePath": workspace_path,
+            "workspace": uris.from_fs_path(workspace_path),
+            **overrides,
+        }
+    )
+
+
+def _document(path: Path, source: str, version: int = 1) -> Document:
+    uri = uris.from_fs_path(str(path))
+    assert uri is not None
+    return Document(
+        uri=uri,
+        path=str(path),
+        kind=DocumentKind.Text,
+        version=version,
+        _source=source,
+    )
+
+
+def _unused_import_diagnostic(fix_content: str) -> Diagnostic:
+    """Returns an `F401` diagnostic for `import os`, replacing it with the given
+    content when fixed."""
+    data: dict[str, Any] = {
+        "fix": {
+            "applicability": "safe",
+            "message": "Remove unused import: `os`",
+            "edits": [
+                {
+                    "content": fix_content,
+                    "location": {"row": 1, "column": 0},
+                    "end_location": {"row": 2, "column": 0},
+                }
+            ],
+        },
+        "noqa_row": None,
+        "cell": None,
+    }
+    return Diagnostic(
+        range=Range(
+            start=Position(line=0, character=7), end=Position(line=0, character=9)
+        ),
+        message="`os` imported but unused",
+        code="F401",
+        source="Ruff",
+        data=data,
+    )
+
+
+def test_find_ruff_binary_forgets_removed_executable(tmp_path, monkeypatch):
+    executable = _find_ruff_binary(_workspace_settings(str(tmp_path)), None)
+
+    # Use a copy of the executable, which can be removed later on.
+    copy = tmp_path.joinpath(TOOL_MODULE)
+    shutil.copy2(executable.path, copy)
+    settings = _workspace_settings(str(tmp_path), path=[str(copy)])
+    assert _find_ruff_binary(settings, None).path == str(copy)
+    assert str(copy) in BINARY_PATHS.values()
+
+    copy.unlink()
+    monkeypatch.setattr(server, "EXECUTABLE_VERSION_TTL", 0)
+
+    fallback = _find_ruff_binary(settings, None)
+    assert fallback.path != str(copy)
+    assert fallback.version == executable.version
+    assert str(copy) not in BINARY_PATHS.values()
+
+
+def test_find_ruff_binary_without_interpreter(tmp_path):
+    # Clients may send `null` rather than omitting the setting.
+    settings = _workspace_settings(str(tmp_path), interpreter=None)
+    executable = _find_ruff_binary(settings, None)
+    assert _find_ruff_binary(settings, None) == executable
+    assert list(BINARY_PATHS.values()) == [executable.path]
+
+
+@pytest.mark.asyncio
+async def test_code_action_reflects_diagnostic_data(text_document_uri: str):
+    def params(fix_content: str) -> CodeActionParams:
+        return CodeActionParams(
+            text_document=TextDocumentIdentifier(uri=text_document_uri),
+            range=Range(
+                start=Position(line=0, character=0), end=Position(line=0, character=0)
+            ),
+            context=CodeActionContext(
+                diagnostics=[_unused_import_diagnostic(fix_content)],
+                only=[CodeActionKind.QuickFix],
+            ),
+        )
+
+    def new_texts(actions: list[CodeAction] | None) -> list[str]:
+        assert actions is not None
+        texts: list[str] = []
+        for action in actions:
+            assert action.edit is not None
+            assert action.edit.document_changes is not None
+            for change in action.edit.document_changes:
+                assert isinstance(change, TextDocumentEdit)
+                texts.extend(edit.new_text for edit in change.edits)
+        return texts
+
+    assert new_texts(await code_action(params(""))) == [""]
+
+    # The same diagnostic with a different fix yields a different action.
+    assert new_texts(await code_action(params("import os as _os\n"))) == [
+        "import os as _os\n"
+    ]
+
+
+@pytest.mark.asyncio
+async def test_lint_cache_hits_and_misses(tmp_path, ruff_runs: list[Document]):
+    settings = _workspace_settings(str(tmp_path))
+    path = tmp_path.joinpath("main.py")
+
+    diagnostics = await _lint_document_impl(_document(path, SOURCE), settings)
+    assert [diagnostic.code for diagnostic in diagnostics] == ["F401"]
+    assert len(ruff_runs) == 1
+
+    # Identical source (e.g., after undoing an edit) is served from the cache.
+    assert await _lint_document_impl(_document(path, SOURCE, 2), settings) == (
+        diagnostics
+    )
+    assert len(ruff_runs) == 1
+
+    # Changed source, or changed settings, are linted anew.
+    assert await _lint_document_impl(_document(path, "import sys\n"), settings)
+    assert len(ruff_runs) == 2
+    settings = _workspace_settings(str(tmp_path), lint={"args": ["--select=E"]})
+    assert await _lint_document_impl(_document(path, SOURCE), settings) == []
+    assert len(ruff_runs) == 3
+
+    # As are documents linted after Ruff's configuration may have changed.
+    _invalidate_results()
+    assert await _lint_document_impl(_document(path, SOURCE), settings) == []
+    assert len(ruff_runs) == 4
+
+
+@pytest.mark.asyncio
+async def test_lint_cache_evicts_least_recently_used(
+    tmp_path, monkeypatch, ruff_runs: list[Document]
+):
+    monkeypatch.setattr(server, "LINT_CACHE_SIZE", 2)
+    settings = _workspace_settings(str(tmp_path))
+    path = tmp_path.joinpath("main.py")
+    first, second, third = (
+        _document(path, f"import {module}\n") for module in ("os", "sys", "json")
+    )
+
+    await _lint_document_impl(first, settings)
+    await _lint_document_impl(second, settings)
+    # Using the first result makes the second one the least recently used.
+    await _lint_document_impl(first, settings)
+    await _lint_document_impl(third, settings)
+    assert len(LINT_CACHE) == 2
+    assert len(ruff_runs) == 3
+
+    await _lint_document_impl(first, settings)
+    await _lint_document_impl(third, settings)
+    assert len(ruff_runs) == 3
+
+    await _lint_document_impl(second, settings)
+    assert ruff_runs[-1] is second
+    assert len(ruff_runs) == 4
+
+
+@pytest.mark.asyncio
+async def test_concurrent_lints_share_ruff_run(tmp_path, ruff_runs: list[Document]):
+    settings = _workspace_settings(str(tmp_path))
+    path = tmp_path.joinpath("main.py")
+
+    first, second = await asyncio.gather(
+        _lint_document_impl(_document(path, SOURCE, 1), settings),
+        _lint_document_impl(_document(path, SOURCE, 2), settings),
+    )
+    assert [diagnostic.code for diagnostic in first] == ["F401"]
+    assert first == second
+    assert len(ruff_runs) == 1
+    assert not INFLIGHT_LINTS
+
+
+@pytest.mark.asyncio
+async def test_fix_cache_hits(tmp_path, ruff_runs: list[Document]):
+    settings = _workspace_settings(str(tmp_path))
+    path = tmp_path.joinpath("main.py")
+
+    workspace_edit = await _fix_document_impl(_document(path, SOURCE), settings)
+    assert workspace_edit is not None
+    assert len(ruff_runs) == 1
+
+    assert await _fix_document_impl(_document(path, SOURCE), settings) is (
+        workspace_edit
+    )
+    assert len(ruff_runs) == 1
+
+    # Fixing a subset of the rules is a distinct request.
+    assert await _fix_document_impl(_document(path, SOURCE), settings, only=["F401"])
+    assert len(ruff_runs) == 2
+
+
+def test_publish_diagnostics_skips_identical(
+    published: list[tuple[str, list[Diagnostic]]],
+):
+    uri = "file:///tmp/main.py"
+
+    _publish_diagnostics(uri, [_unused_import_diagnostic("")])
+    _publish_diagnostics(uri, [_unused_import_diagnostic("")])
+    assert len(published) == 1
+
+    _publish_diagnostics(uri, [])
+    _publish_diagnostics(uri, [])
+    assert published == [(uri, [_unused_import_diagnostic("")]), (uri, [])]
+
+
+@pytest.mark.asyncio
+async def test_did_save_keeps_results_unless_config_changed(
+    tmp_path,
+    text_document_uri: str,
+    ruff_runs: list[Document],
+    published: list[tuple[str, list[Diagnostic]]],
+):
+    settings = _workspace_settings(str(tmp_path))
+    other = _document(tmp_path.joinpath("other.py"), SOURCE)
+    await _lint_document_impl(other, settings)
+
+    def other_runs() -> int:
+        return sum(document.path == other.path for document in ruff_runs)
+
+    # Saving a Python file leaves the results for other documents intact.
+    await did_save(
+        DidSaveTextDocumentParams(
+            text_document=TextDocumentIdentifier(uri=text_document_uri)
+        )
+    )
+    assert [uri for uri, _ in published] == [text_document_uri]
+    await _lint_document_impl(other, settings)
+    assert other_runs() == 1
+
+    # Saving Ruff's configuration discards them.
+    config = tmp_path.joinpath("pyproject.toml")
+    config.write_text("[tool.ruff]\n")
+    config_uri = uris.from_fs_path(str(config))
+    assert config_uri is not None
+    LSP_SERVER.workspace.put_text_document(
+        TextDocumentItem(
+            uri=config_uri, language_id="toml", version=1, text=config.read_text()
+        )
+    )
+    await did_save(
+        DidSaveTextDocumentParams(text_document=TextDocumentIdentifier(uri=config_uri))
+    )
+    await _lint_document_impl(other, settings)
+    assert other_runs() == 2
+
+
+@pytest.mark.asyncio
+async def test_did_save_skips_linted_source(
+    tmp_path,
+    text_document_uri: str,
+    ruff_runs: list[Document],
+    published: list[tuple[str, list[Diagnostic]]],
+):
+    params = DidSaveTextDocumentParams(
+        text_document=TextDocumentIdentifier(uri=text_document_uri)
+    )
+
+    await did_save(params)
+    assert len(ruff_runs) == 1
+    assert len(published) == 1
+
+    # The saved source was linted already, so there's nothing to refresh.
+    await did_save(params)
+    assert len(ruff_runs) == 1
+
+    # Unless the published diagnostics differ, which are then refreshed from the cache.
+    PUBLISHED_DIAGNOSTICS.pop(text_document_uri)
+    await did_save(params)
+    assert len(ruff_runs) == 1
+    assert len(published) == 2
+
+    # Or Ruff's configuration changed since.
+    _invalidate_results()
+    await did_save(params)
+    assert len(ruff_runs) == 2
+
+
+@pytest.mark.asyncio
+async def test_fix_all_skipped_without_fixes(tmp_path, ruff_runs: list[Document]):
+    settings = _workspace_settings(str(tmp_path))
+    document = _document(
+        tmp_path.joinpath("main.py"), "import sys\nimport os\n\nprint(sys, os)\n"
+    )
+
+    assert await _lint_document_impl(document, settings) == []
+    assert len(ruff_runs) == 1
+
+    # The latest lint found nothing to fix, so there's no need to run Ruff.
+    assert await _fix_document_impl(document, settings) is None
+    assert len(ruff_runs) == 1
+
+    # Unless Ruff's configuration changed since, e.g., to sort the imports.
+    tmp_path.joinpath("pyproject.toml").write_text(
+        '[tool.ruff.lint]\nextend-select = ["I"]\n'
+    )
+    _invalidate_results()
+    assert await _fix_document_impl(document, settings) is not None
+    assert len(ruff_runs) == 2
@@ -12,6 +12,7 @@ from ruff_lsp.server import (
     VERSION_REQUIREMENT_RANGE_FORMATTING,
     Document,
     _fixed_source_to_edits,
+    _get_line_endings,
     _get_settings_by_document,
     _run_format_on_document,
 )
@@ -125,3 +126,19 @@ print ("Not formatted")
         assert edit.range == Range(
             start=Position(line=3, character=0), end=Position(line=5, character=0)
         )
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("", None),
+        ("x = 1", None),
+        ("x = 1\ny = 2\n", "\n"),
+        ("x = 1\r\ny = 2\r\n", "\r\n"),
+        ("x = 1\ry = 2\r", "\r"),
+        ("x = 1\ny = 2\r\n", "\n"),
+        ("x = 1\ry = 2\n", "\r"),
+    ],
+)
+def test_get_line_endings(text: str, expected: str | None):
+    assert _get_line_endings(text) == expected
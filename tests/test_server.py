@@ -7,9 +7,30 @@ import tempfile
 from dataclasses import dataclass
 from threading import Event
 
+import pytest
+from lsprotocol.types import (
+    Diagnostic,
+    DidChangeTextDocumentParams,
+    MessageType,
+    TextDocumentContentChangeEvent_Type2,
+    TextDocumentItem,
+    VersionedTextDocumentIdentifier,
+)
 from packaging.version import Version
+from pygls.workspace import Workspace
 from typing_extensions import Self
 
+from ruff_lsp import server
+from ruff_lsp.server import (
+    LSP_SERVER,
+    PENDING_LINTS,
+    PUBLISHED_DIAGNOSTICS,
+    _schedule_lint,
+    _update_log_level,
+    did_change,
+    log_to_output,
+    uris,
+)
 from tests.client import defaults, session, utils
 
 # Increase this if you want to attach a debugger
@@ -229,3 +250,136 @@ class TestServer:
                     "uri": uri,
                 }
             assert expected == actual
+
+
+@pytest.mark.asyncio
+async def test_schedule_lint_cancels_pending_lint() -> None:
+    uri = "file:///tmp/main.py"
+    linted: list[int] = []
+
+    def lint(version: int):
+        async def _lint() -> None:
+            linted.append(version)
+
+        return _lint
+
+    _schedule_lint(uri, lint(1), delay=0.05)
+    first = PENDING_LINTS[uri]
+    _schedule_lint(uri, lint(2), delay=0.05)
+    second = PENDING_LINTS[uri]
+
+    await second
+    assert first.done()
+    assert linted == [2]
+    assert uri not in PENDING_LINTS
+
+
+@pytest.mark.asyncio
+async def test_schedule_lint_shows_errors(monkeypatch) -> None:
+    uri = "file:///tmp/main.py"
+    errors: list[str] = []
+    monkeypatch.setattr(server, "show_error", errors.append)
+
+    async def lint() -> None:
+        raise RuntimeError("Ruff not found")
+
+    _schedule_lint(uri, lint, delay=0)
+    await PENDING_LINTS[uri]
+    assert errors == ["Ruff: Lint failed (Ruff not found)"]
+
+
+@pytest.mark.asyncio
+async def test_did_change_publishes_latest_version(tmp_path, monkeypatch) -> None:
+    workspace = Workspace(uris.from_fs_path(str(tmp_path)))
+    monkeypatch.setattr(LSP_SERVER.lsp, "_workspace", workspace)
+
+    published: list[tuple[str, list[Diagnostic]]] = []
+    monkeypatch.setattr(
+        LSP_SERVER,
+        "publish_diagnostics",
+        lambda uri, diagnostics: published.append((uri, diagnostics)),
+    )
+
+    path = tmp_path.joinpath("main.py")
+    path.write_text("")
+    uri = uris.from_fs_path(str(path))
+    assert uri is not None
+    workspace.put_text_document(
+        TextDocumentItem(uri=uri, language_id="python", version=0, text="")
+    )
+
+    # Each change replaces the source with an unused import of a different module.
+    for version, module in enumerate(["os", "sys", "json"], start=1):
+        text_document = VersionedTextDocumentIdentifier(uri=uri, version=version)
+        change = TextDocumentContentChangeEvent_Type2(text=f"import {module}\n")
+        workspace.update_text_document(text_document, change)
+        await did_change(
+            DidChangeTextDocumentParams(
+                text_document=text_document, content_changes=[change]
+            )
+        )
+
+    await PENDING_LINTS[uri]
+    try:
+        assert len(published) == 1
+        [(published_uri, diagnostics)] = published
+        assert published_uri == uri
+        assert [diagnostic.message for diagnostic in diagnostics] == [
+            "`json` imported but unused"
+        ]
+    finally:
+        PUBLISHED_DIAGNOSTICS.pop(uri, None)
+
+
+@pytest.mark.parametrize(
+    ("global_settings", "settings", "expected"),
+    [
+        # The default level is `error`.
+        ({}, [], False),
+        ({}, [{}], False),
+        ({"logLevel": "debug"}, [], True),
+        ({"logLevel": "debug"}, [{}], True),
+        ({"logLevel": "info"}, [{"logLevel": "error"}], False),
+        ({"logLevel": "error"}, [{"logLevel": "warn"}, {"logLevel": "info"}], True),
+        ({"logLevel": "error"}, [{"logLevel": "warn"}, {"logLevel": "error"}], False),
+    ],
+)
+def test_update_log_level(monkeypatch, global_settings, settings, expected) -> None:
+    monkeypatch.setattr(server, "GLOBAL_SETTINGS", global_settings)
+    monkeypatch.setattr(server, "_LOG_TO_OUTPUT", not expected)
+
+    _update_log_level(settings)
+    assert server._LOG_TO_OUTPUT is expected
+
+
+def test_log_to_output(monkeypatch) -> None:
+    messages: list[tuple[str, MessageType]] = []
+    monkeypatch.setattr(
+        LSP_SERVER,
+        "show_message_log",
+        lambda message, message_type: messages.append((message, message_type)),
+    )
+
+    class Argument:
+        formatted = False
+
+        def __str__(self) -> str:
+            self.formatted = True
+            return "argument"
+
+    # Messages are only formatted when they're sent.
+    monkeypatch.setattr(server, "_LOG_TO_OUTPUT", False)
+    argument = Argument()
+    log_to_output("Debug: %s", argument)
+    assert not argument.formatted
+    log_to_output("Always: %s", argument, always=True)
+    assert argument.formatted
+
+    monkeypatch.setattr(server, "_LOG_TO_OUTPUT", True)
+    log_to_output("Debug: %s", Argument())
+    log_to_output("Debug: 100%")
+    assert messages == [
+        ("Always: argument", MessageType.Log),
+        ("Debug: argument", MessageType.Log),
+        ("Debug: 100%", MessageType.Log),
+    ]
@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+
+from ruff_lsp.settings import LINT_DEBOUNCE_MS, UserSettings, lint_debounce
+
+
+@pytest.mark.parametrize(
+    "settings, expected",
+    [
+        ({}, LINT_DEBOUNCE_MS),
+        ({"lint": {}}, LINT_DEBOUNCE_MS),
+        ({"lint": {"debounce": 150}}, 150),
+        ({"lint": {"debounce": 0}}, 0),
+        ({"lint": {"debounce": -10}}, 0),
+        ({"lint": {"debounce": "150"}}, LINT_DEBOUNCE_MS),
+        ({"lint": {"debounce": 1.5}}, LINT_DEBOUNCE_MS),
+        ({"lint": {"debounce": True}}, LINT_DEBOUNCE_MS),
+        ({"lint": {"debounce": None}}, LINT_DEBOUNCE_MS),
+    ],
+)
+def test_lint_debounce(settings: dict[str, Any], expected: int):
+    assert lint_debounce(UserSettings(**settings)) == expected  # type: ignore[misc]
+
+
+def test_lint_debounce_default():
+    assert LINT_DEBOUNCE_MS == 20